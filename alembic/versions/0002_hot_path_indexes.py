@@ -0,0 +1,79 @@
+"""Indexes for /api/info, /api/buy and /api/sendCoin
+
+Revision ID: 0002_hot_path_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_hot_path_indexes'
+down_revision: Union[str, None] = '0001_baseline'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Older builds could insert duplicate (user_id, item_name) rows under
+    # concurrent purchases; fold them into one row before adding the constraint.
+    op.execute(sa.text(
+        """
+        WITH merged AS (
+            SELECT min(id) AS keep_id, user_id, item_name, sum(quantity) AS quantity
+            FROM inventory
+            GROUP BY user_id, item_name
+            HAVING count(*) > 1
+        ), updated AS (
+            UPDATE inventory SET quantity = merged.quantity
+            FROM merged
+            WHERE inventory.id = merged.keep_id
+        )
+        DELETE FROM inventory
+        USING merged
+        WHERE inventory.user_id = merged.user_id
+          AND inventory.item_name = merged.item_name
+          AND inventory.id <> merged.keep_id
+        """
+    ))
+    op.create_unique_constraint(
+        'uq_inventory_user_item', 'inventory', ['user_id', 'item_name']
+    )
+
+    # Built concurrently so that large transaction tables stay writable.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_transactions_to_user_created',
+            'transactions',
+            ['to_user_id', 'created_at', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+        op.create_index(
+            'ix_transactions_from_user_created',
+            'transactions',
+            ['from_user_id', 'created_at', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_transactions_from_user_created',
+            table_name='transactions',
+            postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_transactions_to_user_created',
+            table_name='transactions',
+            postgresql_concurrently=True
+        )
+    op.drop_constraint('uq_inventory_user_item', 'inventory', type_='unique')
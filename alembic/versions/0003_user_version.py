@@ -0,0 +1,29 @@
+"""Per-user version counter for cache consistency
+
+Revision ID: 0003_user_version
+Revises: 0002_hot_path_indexes
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_user_version'
+down_revision: Union[str, None] = '0002_hot_path_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'users',
+        sa.Column('version', sa.BigInteger(), server_default='0', nullable=False)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'version')
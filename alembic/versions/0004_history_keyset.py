@@ -0,0 +1,42 @@
+"""Make transactions.created_at NOT NULL for keyset pagination
+
+Revision ID: 0004_history_keyset
+Revises: 0003_user_version
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004_history_keyset'
+down_revision: Union[str, None] = '0003_user_version'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # History pages compare (created_at, id) row values; a NULL created_at
+    # would make a row unreachable. The column has always defaulted to now(),
+    # so this only catches rows inserted with an explicit NULL.
+    op.execute("UPDATE transactions SET created_at = now() WHERE created_at IS NULL")
+    op.alter_column(
+        'transactions',
+        'created_at',
+        existing_type=sa.DateTime(timezone=True),
+        existing_server_default=sa.text('now()'),
+        nullable=False
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        'transactions',
+        'created_at',
+        existing_type=sa.DateTime(timezone=True),
+        existing_server_default=sa.text('now()'),
+        nullable=True
+    )
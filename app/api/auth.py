@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.security import create_access_token, get_password_hash, verify_password
+from app.core.hashing import HashingQueueFull, password_hasher
+from app.core.identity import identity_cache
+from app.core.security import create_access_token
 from app.schemas.auth import AuthRequest, AuthResponse
 from app.db.session import get_db
 from app.models.models import User
@@ -15,17 +17,25 @@ async def authenticate(auth_data: AuthRequest, db: AsyncSession = Depends(get_db
     )
     user = result.scalar_one_or_none()
     
-    if not user:
-        user = User(
-            username=auth_data.username,
-            password_hash=get_password_hash(auth_data.password),
-            coins=1000
+    try:
+        if not user:
+            user = User(
+                username=auth_data.username,
+                password_hash=await password_hasher.hash(auth_data.password),
+                coins=1000
+            )
+            db.add(user)
+            await db.commit()
+            await db.refresh(user)
+        elif not await password_hasher.verify(auth_data.password, user.password_hash):
+            raise HTTPException(status_code=401, detail="Incorrect password")
+    except HashingQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Authentication is overloaded. Please try again later.",
+            headers={"Retry-After": "1"}
         )
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
-    elif not verify_password(auth_data.password, user.password_hash):
-        raise HTTPException(status_code=401, detail="Incorrect password")
     
-    access_token = create_access_token(data={"sub": user.username})
+    identity_cache.put(user.id, user.username)
+    access_token = create_access_token(data={"sub": user.username, "uid": user.id})
     return {"token": access_token}
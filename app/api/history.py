@@ -0,0 +1,185 @@
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from collections.abc import AsyncIterator, Callable
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import literal, select, tuple_, union_all
+from sqlalchemy.orm import aliased
+from app.core.config import settings
+from app.core.identity import CachedUser
+from app.core.security import get_current_identity
+from app.schemas.history import ReceivedHistoryPage, SentHistoryPage
+from app.db.replicas import ReadSession, replica_router
+from app.db.session import get_read_db, get_read_session_factory
+from app.models.models import User, Transaction
+
+router = APIRouter()
+
+Direction = Literal["received", "sent"]
+ExportFormat = Literal["ndjson", "csv"]
+
+EXPORT_COLUMNS = ("id", "createdAt", "direction", "user", "amount")
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def encode_cursor(created_at: datetime, transaction_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{transaction_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, transaction_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(transaction_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def history_statement(
+    user_id: int,
+    direction: Direction,
+    limit: int,
+    after: Optional[tuple[datetime, int]] = None
+):
+    # Newest first. The (created_at, id) row comparison walks
+    # ix_transactions_{to,from}_user_created backwards from the cursor, so every
+    # page costs the same no matter how deep it is.
+    counterpart = aliased(User)
+    own, other = (
+        (Transaction.to_user_id, Transaction.from_user_id) if direction == "received"
+        else (Transaction.from_user_id, Transaction.to_user_id)
+    )
+    statement = (
+        select(Transaction.id, Transaction.created_at, Transaction.amount, counterpart.username)
+        .join(counterpart, other == counterpart.id)
+        .where(own == user_id)
+        .order_by(Transaction.created_at.desc(), Transaction.id.desc())
+        .limit(limit)
+    )
+    if after is not None:
+        statement = statement.where(tuple_(Transaction.created_at, Transaction.id) < after)
+    return statement
+
+async def history_page(
+    db: ReadSession,
+    user_id: int,
+    direction: Direction,
+    limit: int,
+    cursor: Optional[str]
+) -> dict:
+    after = decode_cursor(cursor) if cursor else None
+    # Moves the session to the primary if the replica lacks the user's last write.
+    await replica_router.fresh(db, user_id)
+    result = await db.execute(history_statement(user_id, direction, limit + 1, after))
+    rows = result.all()
+
+    counterpart = "fromUser" if direction == "received" else "toUser"
+    items = [
+        {counterpart: row.username, "amount": row.amount, "createdAt": row.created_at}
+        for row in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return {"items": items, "nextCursor": next_cursor}
+
+@router.get("/history/received", response_model=ReceivedHistoryPage)
+async def get_received_history(
+    limit: int = Query(default=settings.HISTORY_PAGE_SIZE, ge=1, le=settings.HISTORY_PAGE_MAX),
+    cursor: Optional[str] = None,
+    current_user: CachedUser = Depends(get_current_identity),
+    db: ReadSession = Depends(get_read_db)
+):
+    return await history_page(db, current_user.id, "received", limit, cursor)
+
+@router.get("/history/sent", response_model=SentHistoryPage)
+async def get_sent_history(
+    limit: int = Query(default=settings.HISTORY_PAGE_SIZE, ge=1, le=settings.HISTORY_PAGE_MAX),
+    cursor: Optional[str] = None,
+    current_user: CachedUser = Depends(get_current_identity),
+    db: ReadSession = Depends(get_read_db)
+):
+    return await history_page(db, current_user.id, "sent", limit, cursor)
+
+def export_statement(user_id: int):
+    # Each direction can be read in (created_at, id) order from its index, so
+    # for large ledgers Postgres can merge the two instead of sorting.
+    def side(direction: Direction, own, other):
+        counterpart = aliased(User)
+        return (
+            select(
+                Transaction.id,
+                Transaction.created_at,
+                literal(direction).label("direction"),
+                counterpart.username,
+                Transaction.amount
+            )
+            .join(counterpart, other == counterpart.id)
+            .where(own == user_id)
+        )
+
+    ledger = union_all(
+        side("received", Transaction.to_user_id, Transaction.from_user_id),
+        side("sent", Transaction.from_user_id, Transaction.to_user_id)
+    ).subquery()
+    return select(ledger).order_by(ledger.c.created_at, ledger.c.id)
+
+def export_row(row) -> tuple:
+    return row.id, row.created_at.isoformat(), row.direction, row.username, row.amount
+
+def render_ndjson(rows) -> str:
+    return "".join(
+        json.dumps(
+            dict(zip(EXPORT_COLUMNS, export_row(row))),
+            ensure_ascii=False,
+            separators=(",", ":")
+        ) + "\n"
+        for row in rows
+    )
+
+def render_csv(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(export_row(row) for row in rows)
+    return buffer.getvalue()
+
+async def export_ledger(
+    session_factory: Callable[[], ReadSession],
+    user_id: int,
+    export_format: ExportFormat,
+    batch_size: int
+) -> AsyncIterator[str]:
+    # A server-side cursor fetches `batch_size` rows at a time, so memory stays
+    # flat. If the client disconnects, the generator is cancelled and leaving
+    # the session returns the connection to the pool right away.
+    render = render_csv if export_format == "csv" else render_ndjson
+    async with session_factory() as session:
+        await replica_router.fresh(session, user_id)
+        result = await session.stream(
+            export_statement(user_id),
+            execution_options={"yield_per": batch_size}
+        )
+        try:
+            if export_format == "csv":
+                yield ",".join(EXPORT_COLUMNS) + "\r\n"
+            async for rows in result.partitions():
+                yield render(rows)
+        finally:
+            await result.close()
+
+@router.get("/history/export")
+async def export_history(
+    export_format: ExportFormat = Query("ndjson", alias="format"),
+    current_user: CachedUser = Depends(get_current_identity),
+    session_factory: Callable[[], ReadSession] = Depends(get_read_session_factory)
+):
+    return StreamingResponse(
+        export_ledger(
+            session_factory, current_user.id, export_format, settings.HISTORY_EXPORT_BATCH_SIZE
+        ),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="history.{export_format}"'}
+    )
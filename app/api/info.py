@@ -1,61 +1,153 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy import select
-from app.core.security import get_current_user
+from collections.abc import Callable
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, Response
+from sqlalchemy import Text, func, literal_column, select, type_coerce
+from sqlalchemy.dialects.postgresql import ARRAY, JSON, aggregate_order_by
+from sqlalchemy.orm import aliased
+from app.core.config import settings
+from app.core.identity import CachedUser
+from app.core.metrics import info_cache_requests
+from app.core.security import get_current_identity
 from app.schemas.info import InfoResponse
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.session import get_db
-from app.db.cache import redis_cache
+from app.db.replicas import ReadSession, replica_router
+from app.db.session import get_read_session_factory
+from app.db.info_cache import InfoSnapshot, info_cache
 from app.models.models import User, Inventory, Transaction
 
 router = APIRouter()
 
-@router.get("/info", response_model=InfoResponse)
-async def get_info(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-):
-    cache_key = f"user_info:{current_user.id}"
-    cached_data = await redis_cache.get(cache_key)
-    
-    if cached_data:
-        return cached_data
-    
-    result = await db.execute(
-        select(Inventory).where(Inventory.user_id == current_user.id)
+
+def json_list(*fields, order_by):
+    aggregated = func.json_agg(aggregate_order_by(func.json_build_object(*fields), order_by))
+    return type_coerce(func.coalesce(aggregated, literal_column("'[]'::json")), JSON)
+
+def rendered_list(template: str, *values, order_by):
+    # Postgres renders each history entry as compact JSON (to_json escapes the
+    # strings), so neither the fill nor the response has to encode them again.
+    aggregated = func.array_agg(aggregate_order_by(func.format(template, *values), *order_by))
+    return type_coerce(func.coalesce(aggregated, literal_column("'{}'::text[]")), ARRAY(Text))
+
+
+def recent_history(user_id: int, own, other, limit: int):
+    return (
+        select(
+            Transaction.id,
+            Transaction.created_at,
+            Transaction.amount,
+            other.label("counterpart_id")
+        )
+        .where(own == user_id)
+        .order_by(Transaction.created_at.desc(), Transaction.id.desc())
+        .limit(limit)
+        .subquery()
+    )
+
+def info_statement(user_id: int, history_limit: Optional[int] = None):
+    # Only the latest `history_limit` entries per direction are inlined, oldest
+    # first; the rest is served page by page from /api/history.
+    history_limit = settings.INFO_HISTORY_INLINE_LIMIT if history_limit is None else history_limit
+    counterpart = aliased(User)
+    recent_received = recent_history(
+        user_id, Transaction.to_user_id, Transaction.from_user_id, history_limit
+    )
+    recent_sent = recent_history(
+        user_id, Transaction.from_user_id, Transaction.to_user_id, history_limit
+    )
+    inventory = (
+        select(json_list(
+            "type", Inventory.item_name,
+            "quantity", Inventory.quantity,
+            order_by=Inventory.id
+        ))
+        .where(Inventory.user_id == User.id)
+        .scalar_subquery()
     )
-    inventory = result.scalars().all()
-    
-    result = await db.execute(
-        select(Transaction, User.username.label('from_username'))
-        .join(User, Transaction.from_user_id == User.id)
-        .where(Transaction.to_user_id == current_user.id)
+    received = (
+        select(rendered_list(
+            '{"fromUser":%s,"amount":%s}',
+            func.to_json(counterpart.username),
+            recent_received.c.amount,
+            order_by=(recent_received.c.created_at, recent_received.c.id)
+        ))
+        .select_from(recent_received)
+        .join(counterpart, recent_received.c.counterpart_id == counterpart.id)
+        .scalar_subquery()
     )
-    received = result.all()
-    
-    result = await db.execute(
-        select(Transaction, User.username.label('to_username'))
-        .join(User, Transaction.to_user_id == User.id)
-        .where(Transaction.from_user_id == current_user.id)
+    sent = (
+        select(rendered_list(
+            '{"toUser":%s,"amount":%s}',
+            func.to_json(counterpart.username),
+            recent_sent.c.amount,
+            order_by=(recent_sent.c.created_at, recent_sent.c.id)
+        ))
+        .select_from(recent_sent)
+        .join(counterpart, recent_sent.c.counterpart_id == counterpart.id)
+        .scalar_subquery()
     )
-    sent = result.all()
-    
-    response = InfoResponse(
-        coins=current_user.coins,
-        inventory=[
-            {"type": item.item_name, "quantity": item.quantity}
-            for item in inventory
-        ],
-        coinHistory={
-            "received": [
-                {"fromUser": row.from_username, "amount": row.Transaction.amount}
-                for row in received
-            ],
-            "sent": [
-                {"toUser": row.to_username, "amount": row.Transaction.amount}
-                for row in sent
-            ]
-        }
+    return select(
+        User.coins,
+        User.version,
+        inventory.label("inventory"),
+        received.label("received"),
+        sent.label("sent")
+    ).where(User.id == user_id)
+
+def info_etag(user_id: int, version: int) -> str:
+    return f'"{user_id}.{version}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+@router.get("/info", response_model=InfoResponse, responses={304: {"description": "Not Modified"}})
+async def get_info(
+    current_user: CachedUser = Depends(get_current_identity),
+    session_factory: Callable[[], ReadSession] = Depends(get_read_session_factory),
+    if_none_match: Optional[str] = Header(default=None)
+):
+    # users.version is bumped by every purchase and transfer, so it identifies
+    # the document; a revalidation only needs the cached version.
+    if if_none_match:
+        version = await info_cache.version(current_user.id)
+        if version is not None:
+            etag = info_etag(current_user.id, version)
+            if etag_matches(if_none_match, etag):
+                info_cache_requests.inc("not_modified")
+                return not_modified(etag)
+
+    async def snapshot(db: ReadSession):
+        result = await db.execute(info_statement(current_user.id))
+        row = result.one()
+        return InfoSnapshot(
+            row.coins,
+            row.version,
+            [(item["type"], item["quantity"]) for item in row.inventory],
+            row.received,
+            row.sent
+        )
+
+    async def load(db: ReadSession):
+        loaded = await snapshot(db)
+        # The document is cached until the user's next write: a replica that
+        # has not replayed the last one is read again on the primary.
+        if not await replica_router.confirm(db, current_user.id, loaded.version):
+            loaded = await snapshot(db)
+        return loaded
+
+    # The cached body is already a valid InfoResponse: return it as is instead
+    # of validating and encoding it again through response_model.
+    body, version = await info_cache.get_or_load(current_user.id, load, session_factory)
+    etag = info_etag(current_user.id, version)
+    if if_none_match and etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"}
     )
-    
-    await redis_cache.set(cache_key, response.model_dump(), expire=300)
-    return response
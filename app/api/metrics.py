@@ -0,0 +1,9 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.core.metrics import registry
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
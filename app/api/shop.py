@@ -1,50 +1,121 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
-from app.core.security import get_current_user
+from sqlalchemy import BigInteger, Integer, String, column, literal, select, true, update, values
+from sqlalchemy.dialects.postgresql import insert
+from app.core.identity import CachedUser
+from app.core.security import get_current_identity
 from app.core.config import MERCH_PRICES
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
-from app.db.cache import redis_cache
+from app.db.info_cache import info_cache
+from app.db.replicas import replica_router
 from app.models.models import User, Inventory
+from app.schemas.shop import CheckoutRequest
 
 router = APIRouter()
 
+
+def purchase_statement(user_id: int, item: str, price: int):
+    debit = (
+        update(User)
+        .where(User.id == user_id, User.coins >= price)
+        .values(coins=User.coins - price, version=User.version + 1)
+        .returning(User.id, User.coins, User.version)
+        .cte("debit")
+    )
+    upsert = insert(Inventory).from_select(
+        ["user_id", "item_name", "quantity"],
+        select(debit.c.id, literal(item), literal(1))
+    )
+    return (
+        upsert.on_conflict_do_update(
+            constraint="uq_inventory_user_item",
+            set_={"quantity": Inventory.quantity + upsert.excluded.quantity}
+        )
+        .returning(
+            select(debit.c.coins).scalar_subquery().label("coins"),
+            select(debit.c.version).scalar_subquery().label("version")
+        )
+        .add_cte(debit)
+    )
+
+
+def checkout_statement(user_id: int, cart: dict[str, int], total: int):
+    # One guarded debit for the whole cart and one upsert for all of its
+    # rows: either every item is bought or, without enough coins, none is.
+    debit = (
+        update(User)
+        .where(User.id == user_id, User.coins >= literal(total, BigInteger))
+        .values(coins=User.coins - literal(total, BigInteger), version=User.version + 1)
+        .returning(User.id, User.coins, User.version)
+        .cte("debit")
+    )
+    lines = values(
+        column("item_name", String), column("quantity", Integer), name="cart"
+    ).data(sorted(cart.items()))
+    upsert = insert(Inventory).from_select(
+        ["user_id", "item_name", "quantity"],
+        select(debit.c.id, lines.c.item_name, lines.c.quantity)
+        .select_from(debit.join(lines, true()))
+    )
+    return (
+        upsert.on_conflict_do_update(
+            constraint="uq_inventory_user_item",
+            set_={"quantity": Inventory.quantity + upsert.excluded.quantity}
+        )
+        .returning(
+            select(debit.c.coins).scalar_subquery().label("coins"),
+            select(debit.c.version).scalar_subquery().label("version")
+        )
+        .add_cte(debit)
+    )
+
 @router.get("/buy/{item}")
 async def buy_item(
     item: str,
-    current_user: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_current_identity),
     db: AsyncSession = Depends(get_db)
 ):
     if item not in MERCH_PRICES:
         raise HTTPException(status_code=404, detail="Invalid item")
     
     price = MERCH_PRICES[item]
-    if current_user.coins < price:
+    result = await db.execute(purchase_statement(current_user.id, item, price))
+    purchase = result.one_or_none()
+    if purchase is None:
         raise HTTPException(status_code=400, detail="Insufficient coins")
     
-    current_user.coins -= price
+    await db.commit()
     
-    result = await db.execute(
-        select(Inventory).where(
-            Inventory.user_id == current_user.id,
-            Inventory.item_name == item
-        )
+    await asyncio.gather(
+        info_cache.record_purchase(current_user.id, purchase.version, item, price),
+        replica_router.record_write(current_user.id, purchase.version)
     )
-    inventory_item = result.scalar_one_or_none()
     
-    if inventory_item:
-        inventory_item.quantity += 1
-    else:
-        inventory_item = Inventory(
-            user_id=current_user.id,
-            item_name=item,
-            quantity=1
-        )
-        db.add(inventory_item)
+    return {"message": "Item purchased successfully"}
+
+@router.post("/buy")
+async def checkout(
+    request: CheckoutRequest,
+    current_user: CachedUser = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db)
+):
+    if any(item not in MERCH_PRICES for item in request.items):
+        raise HTTPException(status_code=404, detail="Invalid item")
+    
+    total = sum(MERCH_PRICES[item] * quantity for item, quantity in request.items.items())
+    result = await db.execute(checkout_statement(current_user.id, request.items, total))
+    purchase = result.first()
+    if purchase is None:
+        raise HTTPException(status_code=400, detail="Insufficient coins")
     
     await db.commit()
     
-    cache_key = f"user_info:{current_user.id}"
-    await redis_cache.delete(cache_key)
+    # The cache patch applies a single unit of a single item, so a cart
+    # drops the cached /api/info once instead.
+    await asyncio.gather(
+        info_cache.invalidate(current_user.id),
+        replica_router.record_write(current_user.id, purchase.version)
+    )
     
-    return {"message": "Item purchased successfully"}
+    return {"message": "Items purchased successfully"}
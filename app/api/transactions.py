@@ -1,48 +1,35 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
-from app.core.security import get_current_user
+from app.core.identity import CachedUser
+from app.core.security import get_current_identity
 from app.schemas.transaction import SendCoinRequest
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.cache import redis_cache
+from app.db.info_cache import info_cache
+from app.db.replicas import replica_router
 from app.db.session import get_db
-from app.models.models import User
-from app.models.models import Transaction
-from sqlalchemy import select
+from app.services.transfers import transfer_coins
 
 router = APIRouter()
 
 @router.post("/sendCoin")
 async def send_coin(
     request: SendCoinRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_current_identity),
     db: AsyncSession = Depends(get_db)
 ):
-    if current_user.coins < request.amount:
-        raise HTTPException(status_code=400, detail="Insufficient coins")
-    
     if current_user.username == request.toUser:
         raise HTTPException(status_code=400, detail="Cannot send coins to yourself")
     
-    recipient = await db.execute(
-        select(User).where(User.username == request.toUser)
-    )
-    recipient = recipient.scalar_one_or_none()
-    
-    if not recipient:
-        raise HTTPException(status_code=404, detail="Recipient not found")
+    transfer = await transfer_coins(db, current_user.id, request.toUser, request.amount)
     
-    current_user.coins -= request.amount
-    recipient.coins += request.amount
-    
-    transaction = Transaction(
-        from_user_id=current_user.id,
-        to_user_id=recipient.id,
-        amount=request.amount
+    await asyncio.gather(
+        info_cache.record_transfer(
+            current_user.id, current_user.username, transfer.sender_version,
+            transfer.recipient_id, request.toUser, transfer.recipient_version,
+            request.amount
+        ),
+        replica_router.record_write(current_user.id, transfer.sender_version),
+        replica_router.record_write(transfer.recipient_id, transfer.recipient_version)
     )
     
-    db.add(transaction)
-    await db.commit()
-    
-    await redis_cache.delete(f"user_info:{current_user.id}")
-    await redis_cache.delete(f"user_info:{recipient.id}")
-    
     return {"message": "Coins sent successfully"}
@@ -1,3 +1,4 @@
+from typing import Literal, Optional
 from pydantic import RedisDsn, SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -25,6 +26,72 @@ class Settings(BaseSettings):
     SECRET_KEY: SecretStr
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24
 
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    # A ping costs BEGIN, a query and ROLLBACK on every checkout; connections
+    # are retired by DB_POOL_RECYCLE instead
+    DB_POOL_PRE_PING: bool = False
+    # Prepared statements cached per connection; 0 behind pgbouncer in
+    # transaction pooling mode
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Read-only routes use a replica whose lag is under DB_REPLICA_MAX_LAG
+    # seconds, else the primary. A user's own reads stay on the primary until
+    # the replica has caught up with their last write.
+    DB_REPLICA_URLS: list[str] = []
+    DB_REPLICA_MAX_LAG: float = 1.0
+    DB_REPLICA_CHECK_INTERVAL: float = 1.0
+    # Seconds a replica gets to connect and answer a lag check or a read;
+    # a read that runs out of time is retried on the primary.
+    DB_REPLICA_TIMEOUT: float = 1.0
+    DB_READ_YOUR_WRITES_TTL: int = 30
+
+    # Blocking pool: callers wait up to REDIS_POOL_TIMEOUT for a connection
+    # instead of failing with "Too many connections"
+    REDIS_POOL_SIZE: int = 50
+    REDIS_POOL_TIMEOUT: float = 5.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+
+    METRICS_ENABLED: bool = True
+    # Debug only: X-DB-Queries, X-DB-Round-Trips and X-DB-Time on every response
+    DB_QUERY_HEADERS: bool = False
+
+    # Request metadata for tests/load/replay.py; bodies are reduced to their
+    # shape and user names are hashed with CAPTURE_KEY (SECRET_KEY if unset).
+    # {pid} keeps the logs of several workers apart.
+    CAPTURE_ENABLED: bool = False
+    CAPTURE_PATH: str = "capture/traffic-{pid}.jsonl"
+    CAPTURE_MAX_BYTES: int = 64 * 1024 * 1024
+    CAPTURE_BACKUP_COUNT: int = 10
+    CAPTURE_KEY: Optional[SecretStr] = None
+
+    HASH_EXECUTOR: Literal["process", "thread"] = "process"
+    HASH_POOL_SIZE: int = 2
+    HASH_QUEUE_DEPTH: int = 64
+
+    IDENTITY_CACHE_SIZE: int = 10000
+    IDENTITY_CACHE_TTL: int = 300
+
+    INFO_CACHE_TTL: int = 3600
+    # /api/info inlines only the most recent entries of each history list;
+    # older ones are paged through /api/history
+    INFO_HISTORY_INLINE_LIMIT: int = 100
+    HISTORY_PAGE_SIZE: int = 50
+    HISTORY_PAGE_MAX: int = 500
+    HISTORY_EXPORT_BATCH_SIZE: int = 1000
+
+    NEAR_CACHE_ENABLED: bool = True
+    NEAR_CACHE_MAX_ENTRIES: int = 10000
+    NEAR_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    NEAR_CACHE_TTL: float = 5.0
+
+    # Values stored through RedisCache.get/set; see app/db/value_codecs.py
+    CACHE_SERIALIZER: Literal["json", "msgpack"] = "msgpack"
+    CACHE_COMPRESS_THRESHOLD: Optional[int] = 1024
+    CACHE_COMPRESS_LEVEL: int = 1
+
     model_config = SettingsConfigDict(
         case_sensitive=True,
         env_file='.env',
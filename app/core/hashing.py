@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Optional
+from passlib.context import CryptContext
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class HashingQueueFull(Exception):
+    pass
+
+
+class HashingStats:
+    __slots__ = (
+        "completed",
+        "rejected",
+        "queue_wait_total",
+        "queue_wait_max",
+        "hash_time_total",
+        "hash_time_max",
+    )
+
+    def __init__(self):
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+
+    def record(self, queue_wait: float, hash_time: float):
+        self.completed += 1
+        self.queue_wait_total += queue_wait
+        self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+        self.hash_time_total += hash_time
+        self.hash_time_max = max(self.hash_time_max, hash_time)
+
+
+def _run(method: str, *args: Any) -> tuple[Any, float, float]:
+    # Runs inside the worker. time.monotonic is system-wide on Linux, so the
+    # start timestamp is comparable with the submit time taken in the parent.
+    started = time.monotonic()
+    result = getattr(pwd_context, method)(*args)
+    return result, started, time.monotonic() - started
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        executor: Optional[str] = None,
+        pool_size: Optional[int] = None,
+        queue_depth: Optional[int] = None,
+    ):
+        self.kind = executor or settings.HASH_EXECUTOR
+        self.pool_size = pool_size or settings.HASH_POOL_SIZE
+        self.queue_depth = settings.HASH_QUEUE_DEPTH if queue_depth is None else queue_depth
+        self.stats = HashingStats()
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                try:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.pool_size,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                except OSError:
+                    # e.g. no /dev/shm for the pool's semaphores
+                    logger.warning(
+                        "Password hashing process pool unavailable, falling back to threads",
+                        exc_info=True
+                    )
+                    self.kind = "thread"
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.pool_size,
+                    thread_name_prefix="password-hasher",
+                )
+        return self._executor
+
+    def _fallback_to_threads(self, broken: Executor):
+        # Every hash in flight fails when the pool breaks; only the first one
+        # to get here replaces it.
+        if self._executor is not broken:
+            return
+        logger.warning("Password hashing process pool unavailable, falling back to threads")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self.kind = "thread"
+
+    async def _submit(self, method: str, *args: Any) -> Any:
+        if self._pending >= self.pool_size + self.queue_depth:
+            self.stats.rejected += 1
+            raise HashingQueueFull()
+
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        submitted = time.monotonic()
+        try:
+            executor = self._get_executor()
+            try:
+                result, started, hash_time = await loop.run_in_executor(
+                    executor, _run, method, *args
+                )
+            except (BrokenProcessPool, OSError):
+                if not isinstance(executor, ProcessPoolExecutor):
+                    raise
+                self._fallback_to_threads(executor)
+                submitted = time.monotonic()
+                result, started, hash_time = await loop.run_in_executor(
+                    self._get_executor(), _run, method, *args
+                )
+        finally:
+            self._pending -= 1
+
+        queue_wait = max(started - submitted, 0.0)
+        self.stats.record(queue_wait, hash_time)
+        logger.debug(
+            "password %s: queue_wait=%.1fms hash_time=%.1fms",
+            method, queue_wait * 1000, hash_time * 1000
+        )
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit("verify", plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+password_hasher = PasswordHasher()
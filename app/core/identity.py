@@ -0,0 +1,49 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.core.config import settings
+
+
+class CachedUser:
+    __slots__ = ("id", "username", "expires_at")
+
+    def __init__(self, user_id: int, username: str, expires_at: float = 0.0):
+        self.id = user_id
+        self.username = username
+        self.expires_at = expires_at
+
+
+class IdentityCache:
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[int] = None):
+        self.max_size = max_size or settings.IDENTITY_CACHE_SIZE
+        self.ttl = ttl or settings.IDENTITY_CACHE_TTL
+        self._users: OrderedDict[int, CachedUser] = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[CachedUser]:
+        user = self._users.get(user_id)
+        if user is None:
+            return None
+        if user.expires_at <= time.monotonic():
+            del self._users[user_id]
+            return None
+        self._users.move_to_end(user_id)
+        return user
+
+    def put(self, user_id: int, username: str) -> CachedUser:
+        user = CachedUser(user_id, username, time.monotonic() + self.ttl)
+        self._users[user_id] = user
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_size:
+            self._users.popitem(last=False)
+        return user
+
+    def discard(self, user_id: int):
+        self._users.pop(user_id, None)
+
+    def clear(self):
+        self._users.clear()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+identity_cache = IdentityCache()
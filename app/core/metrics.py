@@ -0,0 +1,233 @@
+import bisect
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterator, Sequence
+from typing import Optional
+
+
+# Metrics are recorded from the event loop thread only (request handlers, the
+# SQLAlchemy greenlets and Redis callbacks all run there), so plain attribute
+# updates are enough: no locks on the hot path.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One slot per bucket plus +Inf; counts are per bucket, not cumulative.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        total = 0
+        result = []
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation.
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank and total > 0:
+                return bound
+        return 0.0
+
+
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = tuple[str, ...]
+Collect = Callable[[], dict[Labels, float]]
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = (
+        '{}="{}"'.format(
+            name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]: ...
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield from self.samples()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        collect: Optional[Collect] = None
+    ):
+        super().__init__(name, description, labels)
+        self.values: dict[Labels, float] = {}
+        self.collect = collect
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        values = self.collect() if self.collect is not None else self.values
+        for labels, value in values.items():
+            yield f"{self.name}{format_labels(self.labels, labels)} {format_value(value)}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels: str):
+        self.values[labels] = value
+
+
+class HistogramVec(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+        self.children: dict[Labels, Histogram] = {}
+
+    def child(self, *labels: str) -> Histogram:
+        histogram = self.children.get(labels)
+        if histogram is None:
+            histogram = self.children[labels] = Histogram(self.buckets)
+        return histogram
+
+    def observe(self, value: float, *labels: str):
+        self.child(*labels).observe(value)
+
+    def samples(self) -> Iterator[str]:
+        names = (*self.labels, "le")
+        for labels, histogram in self.children.items():
+            for bound, total in histogram.cumulative():
+                bucket = format_labels(names, (*labels, format_value(bound)))
+                yield f"{self.name}_bucket{bucket} {total}"
+            suffix = format_labels(self.labels, labels)
+            yield f"{self.name}_sum{suffix} {format_value(histogram.sum)}"
+            yield f"{self.name}_count{suffix} {histogram.count}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        collect: Optional[Collect] = None
+    ) -> Counter:
+        return self.register(Counter(name, description, labels, collect))
+
+    def gauge(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        collect: Optional[Collect] = None
+    ) -> Gauge:
+        return self.register(Gauge(name, description, labels, collect))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> HistogramVec:
+        return self.register(HistogramVec(name, description, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status")
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served"
+)
+db_queries = registry.counter("db_queries_total", "SQL statements executed")
+db_query_duration = registry.histogram("db_query_duration_seconds", "SQL statement latency")
+db_round_trips = registry.counter(
+    "db_round_trips_total",
+    "Database round trips: statements, BEGIN, COMMIT, ROLLBACK and pool pre-pings"
+)
+db_queries_per_request = registry.histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", buckets=COUNT_BUCKETS
+)
+db_round_trips_per_request = registry.histogram(
+    "db_round_trips_per_request", "Database round trips per HTTP request", buckets=COUNT_BUCKETS
+)
+db_time_per_request = registry.histogram(
+    "db_time_per_request_seconds", "Time spent in SQL statements per HTTP request"
+)
+db_read_sessions = registry.counter(
+    "db_read_sessions_total", "Read-only sessions by where they were sent", ("target",)
+)
+db_replica_fallbacks = registry.counter(
+    "db_replica_fallbacks_total", "Reads moved from a replica to the primary", ("reason",)
+)
+redis_command_duration = registry.histogram(
+    "redis_command_duration_seconds", "Redis command latency, queueing included", ("command",)
+)
+redis_pipelines = registry.counter("redis_pipelines_total", "Auto-pipelined Redis round trips")
+rate_limit_rejections = registry.counter(
+    "rate_limit_rejections_total", "Requests rejected by the rate limiter", ("route", "reason")
+)
+rate_limit_bans = registry.counter("rate_limit_bans_total", "Clients banned for too many errors")
+info_cache_requests = registry.counter(
+    "info_cache_requests_total", "/api/info lookups by cache outcome", ("result",)
+)
@@ -3,16 +3,15 @@ from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 from app.models.models import User
 from app.core.config import settings
+from app.core.hashing import pwd_context
+from app.core.identity import CachedUser, identity_cache
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth")
 
 
@@ -39,31 +38,51 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     )
     return encoded_jwt
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
+
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+def decode_access_token(token: str) -> tuple[Optional[int], str]:
     try:
         payload = jwt.decode(
             token, 
             settings.SECRET_KEY.get_secret_value(), 
             algorithms=["HS256"]
         )
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    result = await db.execute(select(User).where(User.username == username))
-    user = result.scalar_one_or_none()
-    
-    if user is None:
+
+    username = payload.get("sub")
+    user_id = payload.get("uid")
+    if username is None or (user_id is not None and not isinstance(user_id, int)):
         raise credentials_exception
-    return user
+    return user_id, username
+
+
+async def get_current_identity(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> CachedUser:
+    user_id, username = decode_access_token(token)
+
+    if user_id is not None:
+        cached = identity_cache.get(user_id)
+        if cached is not None and cached.username == username:
+            return cached
+        result = await db.execute(
+            select(User.id, User.username).where(User.id == user_id)
+        )
+    else:
+        result = await db.execute(
+            select(User.id, User.username).where(User.username == username)
+        )
+
+    row = result.one_or_none()
+    if row is None or row.username != username:
+        raise credentials_exception
+    return identity_cache.put(row.id, row.username)
+
@@ -1,8 +1,51 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from typing import Any, Optional
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 from app.core.config import settings
+from app.core.metrics import registry
+from app.db import instrumentation  # noqa: F401  (registers the query listeners)
+from app.db.pool import InstrumentedPool
 
 
-engine = create_async_engine(settings.POSTGRES_URL, echo=True)
+def make_engine(url: str, connect_args: Optional[dict[str, Any]] = None, **kwargs) -> AsyncEngine:
+    # Keyword arguments override the settings below; connect_args are added
+    # to the statement cache ones.
+    options = {
+        "echo": settings.DB_ECHO,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": {
+            # asyncpg's own cache and the one SQLAlchemy keeps on top of it
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            **(connect_args or {}),
+        },
+    }
+    return create_async_engine(url, **{**options, **kwargs})
+
+
+engine = make_engine(settings.POSTGRES_URL, poolclass=InstrumentedPool)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
+
+registry.gauge(
+    "db_pool_size", "Connections kept in the pool",
+    collect=lambda: {(): engine.pool.size()}
+)
+registry.gauge(
+    "db_pool_checked_out", "Connections in use",
+    collect=lambda: {(): engine.pool.checkedout()}
+)
+registry.gauge(
+    "db_pool_overflow", "Connections opened beyond pool_size",
+    collect=lambda: {(): max(engine.pool.overflow(), 0)}
+)
+registry.counter(
+    "db_pool_timeouts_total", "Checkouts that hit pool_timeout",
+    collect=lambda: {(): engine.pool.metrics.timeouts}
+)
+db_pool_wait = registry.histogram("db_pool_wait_seconds", "Time to check out a connection")
+db_pool_wait.children[()] = engine.pool.metrics.wait
@@ -1,31 +1,186 @@
 from typing import Any, Optional
-import json
-from redis.asyncio import Redis, from_url
+import asyncio
+import hashlib
+import logging
+import secrets
+import time
+import zlib
+from redis.asyncio import BlockingConnectionPool, Redis, from_url
+from redis.client import NEVER_DECODE
+from redis.exceptions import NoScriptError, RedisError
 from app.core.config import settings
+from app.core.metrics import redis_command_duration, redis_pipelines, registry
+from app.db.value_codecs import ValueCodec, get_serializer
+from app.db.near_cache import NearCache
+
+
+logger = logging.getLogger(__name__)
 
 
 class RedisCache:
-    def __init__(self):
+    invalidation_channel = "cache:invalidate"
+
+    def __init__(self, near: Optional[NearCache] = None, codec: Optional[ValueCodec] = None):
         self._redis: Optional[Redis] = None
+        self._init_lock = asyncio.Lock()
+        self.codec = codec or ValueCodec(get_serializer("json"))
+        self._scripts: dict[str, str] = {}
+        self._queue: list[tuple[tuple[Any, ...], dict[str, Any], asyncio.Future]] = []
+        self._flush_scheduled = False
+        self._flushes: set[asyncio.Task] = set()
+        self.pipelines = 0
+        self.pipelined_commands = 0
+        self.near = near
+        self.origin = secrets.token_hex(8)
+        self._near_ready = False
+        self._invalidations = 0
+        self._listener: Optional[asyncio.Task] = None
 
     async def init(self):
-        if not self._redis:
-            self._redis = await from_url(
-                str(settings.REDIS_URL),
-                encoding="utf-8",
-                decode_responses=True,
-                max_connections=10
-            )
+        # Called from the app lifespan; the lock only guards lazy first use
+        # (scripts, tests) against creating the pool twice.
+        async with self._init_lock:
+            if not self._redis:
+                pool = BlockingConnectionPool.from_url(
+                    str(settings.REDIS_URL),
+                    encoding="utf-8",
+                    decode_responses=True,
+                    max_connections=settings.REDIS_POOL_SIZE,
+                    timeout=settings.REDIS_POOL_TIMEOUT,
+                    health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+                    socket_keepalive=True
+                )
+                self._redis = Redis(connection_pool=pool)
+            if self.near is not None and self._listener is None:
+                self._listener = asyncio.create_task(self._listen())
 
-    async def get(self, key: str) -> Optional[Any]:
+    async def command(self, *args: Any, raw: bool = False) -> Any:
+        # Auto-pipelining: commands issued by any coroutine during the same
+        # loop iteration are sent together as one pipeline on one connection.
+        # raw skips response decoding for binary values.
         if not self._redis:
             await self.init()
-        
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((args, {NEVER_DECODE: True} if raw else {}, future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._schedule_flush)
+        started = time.perf_counter()
+        try:
+            return await future
+        finally:
+            redis_command_duration.observe(time.perf_counter() - started, args[0])
+
+    def _schedule_flush(self):
+        self._flush_scheduled = False
+        queue, self._queue = self._queue, []
+        flush = asyncio.ensure_future(self._flush(queue))
+        self._flushes.add(flush)
+        flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, queue: list[tuple[tuple[Any, ...], dict[str, Any], asyncio.Future]]):
+        self.pipelines += 1
+        self.pipelined_commands += len(queue)
+        redis_pipelines.inc()
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for args, options, _ in queue:
+                    pipe.execute_command(*args, **options)
+                results = await pipe.execute(raise_on_error=False)
+        except BaseException as exc:
+            for _, _, future in queue:
+                if not future.done():
+                    future.set_exception(
+                        exc if isinstance(exc, Exception) else RedisError("Pipeline cancelled")
+                    )
+            if not isinstance(exc, Exception):
+                raise
+            return
+
+        for (_, _, future), result in zip(queue, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _listen(self):
+        # Local entries are only served while subscribed: anything published
+        # while the subscription was down may have been missed. The subscriber
+        # has its own client so it never holds a connection of the shared pool.
+        subscriber = await from_url(str(settings.REDIS_URL), decode_responses=True)
+        try:
+            while True:
+                pubsub = subscriber.pubsub()
+                try:
+                    await pubsub.subscribe(self.invalidation_channel)
+                    self.near.clear()
+                    self._near_ready = True
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._on_invalidation(message["data"])
+                except RedisError as exc:
+                    logger.warning("Near cache invalidation channel lost: %s", exc)
+                    await asyncio.sleep(1)
+                finally:
+                    self._near_ready = False
+                    self.near.clear()
+                    await pubsub.aclose()
+        finally:
+            await subscriber.aclose()
+
+    def _on_invalidation(self, message: str):
+        origin, _, key = message.partition("|")
+        if origin == self.origin:
+            return
+        self._invalidations += 1
+        if key == "*":
+            self.near.clear()
+        else:
+            self.near.discard(key)
+
+    def local_get(self, key: str) -> Optional[Any]:
+        if self.near is None or not self._near_ready:
+            return None
+        return self.near.get(key)
+
+    def local_token(self) -> int:
+        return self._invalidations
+
+    def local_put(self, key: str, value: Any, size: int, token: int):
+        # Skip the store if an invalidation arrived while the value was being
+        # fetched; it may be older than what another worker just wrote.
+        if self.near is not None and self._near_ready and token == self._invalidations:
+            self.near.put(key, value, size)
+
+    def local_discard(self, key: str):
+        # Also fences off fetches still in flight, which may return the value
+        # from before the write that triggered this discard.
+        if self.near is not None:
+            self._invalidations += 1
+            self.near.discard(key)
+
+    def invalidation_message(self, key: str) -> str:
+        return f"{self.origin}|{key}"
+
+    def _decode(self, key: str, value: Optional[bytes], token: int) -> Optional[Any]:
         try:
-            value = await self._redis.get(key)
-            return json.loads(value) if value else None
-        except json.JSONDecodeError:
+            decoded = ValueCodec.decode(value)
+        except (ValueError, zlib.error):
             return None
+        if decoded is not None:
+            self.local_put(key, decoded, len(value), token)
+        return decoded
+
+    async def get(self, key: str) -> Optional[Any]:
+        cached = self.local_get(key)
+        if cached is not None:
+            return cached
+
+        token = self.local_token()
+        return self._decode(key, await self.command("GET", key, raw=True), token)
 
     async def set(
         self, 
@@ -33,29 +188,93 @@ class RedisCache:
         value: Any, 
         expire: Optional[int] = None
     ) -> bool:
-        if not self._redis:
-            await self.init()
-        
         try:
-            value_str = json.dumps(value)
-            if expire:
-                await self._redis.setex(name=key, time=expire, value=value_str)
-            else:
-                await self._redis.set(name=key, value=value_str)
+            encoded = self.codec.encode(value)
+            commands = [
+                self.command("SET", key, encoded, *(("EX", expire) if expire else ()))
+            ]
+            if self.near is not None:
+                commands.append(self.command(
+                    "PUBLISH", self.invalidation_channel, self.invalidation_message(key)
+                ))
+            await asyncio.gather(*commands)
+            self.local_discard(key)
+            self.local_put(key, value, len(encoded), self.local_token())
             return True
-        except (json.JSONDecodeError, Exception):
+        except Exception:
+            self.local_discard(key)
             return False
 
     async def delete(self, key: str) -> bool:
-        if not self._redis:
-            await self.init()
-        
-        deleted = await self._redis.delete(key)
+        deleted, _ = await asyncio.gather(
+            self.command("DEL", key),
+            self.publish_invalidation(key)
+        )
         return deleted > 0
 
+    async def publish_invalidation(self, *keys: str):
+        if self.near is None:
+            return
+
+        await asyncio.gather(*(
+            self.command("PUBLISH", self.invalidation_channel, self.invalidation_message(key))
+            for key in keys
+        ))
+        for key in keys:
+            self.local_discard(key)
+
+    async def incr(self, key: str) -> int:
+        return await self.command("INCR", key)
+
+    async def set_if_absent(self, key: str, value: str, expire_ms: int) -> bool:
+        return bool(await self.command("SET", key, value, "PX", expire_ms, "NX"))
+
+    async def run_script(self, script: str, keys: list[str], args: list[Any]) -> Any:
+        sha = self._scripts.get(script)
+        if sha is None:
+            sha = hashlib.sha1(script.encode(), usedforsecurity=False).hexdigest()
+            self._scripts[script] = sha
+        try:
+            return await self.command("EVALSHA", sha, len(keys), *keys, *args)
+        except NoScriptError:
+            await self.command("SCRIPT", "LOAD", script)
+            return await self.command("EVALSHA", sha, len(keys), *keys, *args)
+
     async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
         if self._redis:
-            await self._redis.close()
+            await self._redis.aclose(close_connection_pool=True)
             self._redis = None
 
-redis_cache = RedisCache()
+redis_cache = RedisCache(
+    NearCache(
+        max_entries=settings.NEAR_CACHE_MAX_ENTRIES,
+        max_bytes=settings.NEAR_CACHE_MAX_BYTES,
+        ttl=settings.NEAR_CACHE_TTL
+    ) if settings.NEAR_CACHE_ENABLED else None,
+    ValueCodec(
+        get_serializer(settings.CACHE_SERIALIZER),
+        settings.CACHE_COMPRESS_THRESHOLD,
+        settings.CACHE_COMPRESS_LEVEL
+    )
+)
+
+if redis_cache.near is not None:
+    def near_cache_stat(stat: str) -> dict[tuple[str, ...], float]:
+        return {(prefix,): stats[stat] for prefix, stats in redis_cache.near.stats().items()}
+
+    registry.gauge(
+        "near_cache_entries", "Entries in the in-process near cache",
+        collect=lambda: {(): len(redis_cache.near)}
+    )
+    registry.gauge(
+        "near_cache_bytes", "Estimated size of the near cache",
+        collect=lambda: {(): redis_cache.near.size}
+    )
+    for stat in ("hits", "misses", "evictions"):
+        registry.counter(
+            f"near_cache_{stat}_total", f"Near cache {stat} by key prefix", ("prefix",),
+            collect=lambda stat=stat: near_cache_stat(stat)
+        )
@@ -0,0 +1,413 @@
+import asyncio
+import json
+import math
+import random
+import secrets
+import time
+from collections.abc import Awaitable, Callable
+from functools import lru_cache
+from typing import Any, NamedTuple, Optional
+from app.core.config import settings
+from app.core.metrics import info_cache_requests
+from app.db.cache import redis_cache
+from app.db.replicas import ReadSession
+
+
+# The /info document is split over four keys so that writes can patch it in
+# place: a hash with the balance, the user's version and the last rebuild
+# time, a hash of item -> quantity and one list of JSON entries per history
+# direction. All of them live under user_info:{id}:{generation}; bumping the
+# generation counter at user_info:{id}:gen orphans the old document, which then
+# expires on its own, and makes any rebuild still in flight write to a key
+# nobody reads. Versions come from users.version, which every write bumps, so a
+# fill never replaces a newer document and a patch is only applied on top of
+# the exact version it follows.
+READ_SCRIPT = """
+local gen = redis.call('GET', KEYS[1]) or '0'
+local doc = ARGV[1] .. ':' .. gen
+local head = redis.call('HMGET', doc, 'coins', 'version', 'delta')
+if not head[1] then
+    return {gen}
+end
+return {
+    gen, head[1], head[2], head[3], redis.call('PTTL', doc),
+    redis.call('HGETALL', doc .. ':inventory'),
+    redis.call('LRANGE', doc .. ':received', 0, -1),
+    redis.call('LRANGE', doc .. ':sent', 0, -1)
+}
+"""
+
+VERSION_SCRIPT = """
+local gen = redis.call('GET', KEYS[1]) or '0'
+return redis.call('HGET', ARGV[1] .. ':' .. gen, 'version')
+"""
+
+# ARGV: base key, generation read before the rebuild, ttl, version, rebuild
+# time in ms, coins, then three length-prefixed sections: inventory (item,
+# quantity pairs), received entries and sent entries, and finally the near
+# cache invalidation channel and message ('' when there is no near cache).
+FILL_SCRIPT = """
+local gen = redis.call('GET', KEYS[1]) or '0'
+if gen ~= ARGV[2] then
+    return 0
+end
+local doc = ARGV[1] .. ':' .. gen
+local current = redis.call('HGET', doc, 'version')
+if current and tonumber(current) >= tonumber(ARGV[4]) then
+    return 0
+end
+
+local keys = {doc, doc .. ':inventory', doc .. ':received', doc .. ':sent'}
+redis.call('DEL', unpack(keys))
+redis.call('HSET', doc, 'coins', ARGV[6], 'version', ARGV[4], 'delta', ARGV[5])
+
+local i = 7
+local count = tonumber(ARGV[i])
+for n = 1, count do
+    redis.call('HSET', keys[2], ARGV[i + 2 * n - 1], ARGV[i + 2 * n])
+end
+i = i + 2 * count + 1
+
+for list = 3, 4 do
+    count = tonumber(ARGV[i])
+    for n = 1, count do
+        redis.call('RPUSH', keys[list], ARGV[i + n])
+    end
+    i = i + count + 1
+end
+
+for k = 1, 4 do
+    redis.call('EXPIRE', keys[k], ARGV[3])
+end
+if ARGV[#ARGV] ~= '' then
+    redis.call('PUBLISH', ARGV[#ARGV - 1], ARGV[#ARGV])
+end
+return 1
+"""
+
+# KEYS are the generation counters of the users touched by one write, ARGV[1]
+# is the history limit and ARGV[2], ARGV[3] the near cache invalidation
+# channel and origin ('' when there is no near cache); ARGV then has six
+# values per user: base key, version produced by the write, balance delta,
+# item bought (or ''), history list ('received', 'sent' or '') and the entry
+# to append. A document that is missing or missed a write is invalidated;
+# history lists keep only their `limit` most recent entries, like the inline
+# history built by info_statement. Every touched document is announced on the
+# channel so other workers drop their near copy.
+PATCH_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local patched = 0
+for user = 1, #KEYS do
+    local a = (user - 1) * 6 + 3
+    if ARGV[3] ~= '' then
+        redis.call('PUBLISH', ARGV[2], ARGV[3] .. '|' .. ARGV[a + 1])
+    end
+    local gen = redis.call('GET', KEYS[user]) or '0'
+    local doc = ARGV[a + 1] .. ':' .. gen
+    local current = tonumber(redis.call('HGET', doc, 'version'))
+    local version = tonumber(ARGV[a + 2])
+    local ttl = redis.call('PTTL', doc)
+    if not current or ttl <= 0 then
+        -- Nothing to patch, but a rebuild may be running on a snapshot taken
+        -- before this write: move to a new generation so its fill is dropped.
+        redis.call('INCR', KEYS[user])
+    elseif current ~= version - 1 then
+        if current < version then
+            redis.call('INCR', KEYS[user])
+        end
+    else
+        redis.call('HINCRBY', doc, 'coins', ARGV[a + 3])
+        redis.call('HSET', doc, 'version', version)
+        if ARGV[a + 4] ~= '' then
+            redis.call('HINCRBY', doc .. ':inventory', ARGV[a + 4], 1)
+            redis.call('PEXPIRE', doc .. ':inventory', ttl)
+        end
+        if ARGV[a + 5] ~= '' and limit > 0 then
+            local list = doc .. ':' .. ARGV[a + 5]
+            if redis.call('RPUSH', list, ARGV[a + 6]) > limit then
+                redis.call('LTRIM', list, -limit, -1)
+            end
+            redis.call('PEXPIRE', list, ttl)
+        end
+        patched = patched + 1
+    end
+end
+return patched
+"""
+
+LOCK_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def dump_entry(entry: dict[str, Any]) -> str:
+    return json.dumps(entry, separators=(",", ":"))
+
+
+quote = lru_cache(maxsize=1024)(json.dumps)
+
+
+class InfoSnapshot(NamedTuple):
+    coins: int
+    version: int
+    inventory: list[tuple[str, int]]
+    # History entries arrive already rendered as compact JSON objects.
+    received: list[str]
+    sent: list[str]
+
+
+def render_info(
+    coins: Any,
+    inventory: list[tuple[str, Any]],
+    received: list[str],
+    sent: list[str]
+) -> bytes:
+    # Builds the InfoResponse body from pre-rendered fragments: no parsing,
+    # validation or per-entry encoding.
+    items = ",".join(
+        f'{{"type":{quote(item)},"quantity":{quantity}}}' for item, quantity in inventory
+    )
+    return (
+        f'{{"coins":{coins},"inventory":[{items}],"coinHistory":'
+        f'{{"received":[{",".join(received)}],"sent":[{",".join(sent)}]}}}}'
+    ).encode()
+
+
+class CachedInfo:
+    __slots__ = ("generation", "body", "version", "refresh")
+
+    def __init__(
+        self,
+        generation: str,
+        body: Optional[bytes] = None,
+        version: int = 0,
+        refresh: bool = False
+    ):
+        self.generation = generation
+        self.body = body
+        self.version = version
+        self.refresh = refresh
+
+
+Loader = Callable[[ReadSession], Awaitable[InfoSnapshot]]
+SessionFactory = Callable[[], ReadSession]
+
+
+class InfoCache:
+    def __init__(
+        self,
+        ttl: Optional[int] = None,
+        history_limit: Optional[int] = None,
+        lock_ttl: float = 5.0,
+        lock_wait: float = 0.5,
+        early_refresh_beta: float = 1.0
+    ):
+        self.ttl = ttl or settings.INFO_CACHE_TTL
+        self.history_limit = (
+            settings.INFO_HISTORY_INLINE_LIMIT if history_limit is None else history_limit
+        )
+        self.lock_ttl = lock_ttl
+        self.lock_wait = lock_wait
+        self.early_refresh_beta = early_refresh_beta
+        self._inflight: dict[int, asyncio.Future] = {}
+
+    def base(self, user_id: int) -> str:
+        return f"user_info:{user_id}"
+
+    def _invalidation_args(self, base: str) -> list[str]:
+        if redis_cache.near is None:
+            return ["", ""]
+        return [redis_cache.invalidation_channel, redis_cache.invalidation_message(base)]
+
+    def _patch_args(self) -> list[Any]:
+        if redis_cache.near is None:
+            return [self.history_limit, "", ""]
+        return [self.history_limit, redis_cache.invalidation_channel, redis_cache.origin]
+
+    async def read(self, user_id: int) -> CachedInfo:
+        base = self.base(user_id)
+        near = redis_cache.local_get(base)
+        if near is not None:
+            return near
+
+        token = redis_cache.local_token()
+        cached = await redis_cache.run_script(READ_SCRIPT, keys=[f"{base}:gen"], args=[base])
+        if len(cached) == 1:
+            return CachedInfo(cached[0])
+
+        generation, coins, version, delta, ttl, inventory, received, sent = cached
+        # XFetch: refresh ahead of expiry with a probability that grows as the
+        # remaining TTL approaches the time the last rebuild took.
+        refresh = (
+            -int(delta) * self.early_refresh_beta * math.log(1.0 - random.random())  # noqa: S311
+            >= ttl
+        )
+        body = render_info(coins, zip(inventory[::2], inventory[1::2]), received, sent)
+        if not refresh:
+            # The near copy is never due for an early refresh; that decision is
+            # taken again on the next read that reaches Redis.
+            redis_cache.local_put(base, CachedInfo(generation, body, int(version)), len(body), token)
+        return CachedInfo(generation, body, int(version), refresh)
+
+    async def version(self, user_id: int) -> Optional[int]:
+        # Cheapest possible check for conditional requests: the near copy, or
+        # one HGET in Redis; None when nothing is cached.
+        base = self.base(user_id)
+        near = redis_cache.local_get(base)
+        if near is not None:
+            return near.version
+        version = await redis_cache.run_script(VERSION_SCRIPT, keys=[f"{base}:gen"], args=[base])
+        return int(version) if version is not None else None
+
+    async def get(self, user_id: int) -> Optional[dict[str, Any]]:
+        body = (await self.read(user_id)).body
+        return json.loads(body) if body is not None else None
+
+    async def fill(
+        self,
+        user_id: int,
+        generation: str,
+        snapshot: InfoSnapshot,
+        delta: float = 0.0
+    ) -> bool:
+        base = self.base(user_id)
+        args: list[Any] = [
+            base, generation, self.ttl, snapshot.version, int(delta * 1000), snapshot.coins,
+            len(snapshot.inventory)
+        ]
+        for item, quantity in snapshot.inventory:
+            args += [item, quantity]
+        for entries in (snapshot.received, snapshot.sent):
+            args.append(len(entries))
+            args += entries
+        args += self._invalidation_args(base)
+
+        filled = bool(await redis_cache.run_script(FILL_SCRIPT, keys=[f"{base}:gen"], args=args))
+        if filled:
+            redis_cache.local_discard(base)
+        return filled
+
+    async def invalidate(self, *user_ids: int):
+        await asyncio.gather(*(
+            redis_cache.incr(f"{self.base(user_id)}:gen") for user_id in user_ids
+        ))
+        await redis_cache.publish_invalidation(*(self.base(user_id) for user_id in user_ids))
+
+    async def get_or_load(
+        self,
+        user_id: int,
+        loader: Loader,
+        session_factory: SessionFactory
+    ) -> tuple[bytes, int]:
+        cached = await self.read(user_id)
+        if cached.body is not None and not cached.refresh:
+            info_cache_requests.inc("hit")
+            return cached.body, cached.version
+        info_cache_requests.inc("miss" if cached.body is None else "refresh")
+
+        flight = self._inflight.get(user_id)
+        if flight is None:
+            flight = asyncio.ensure_future(
+                self._rebuild(user_id, cached, loader, session_factory)
+            )
+            self._inflight[user_id] = flight
+            flight.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+            return await asyncio.shield(flight)
+
+        if cached.body is not None:
+            return cached.body, cached.version
+        try:
+            return await asyncio.shield(flight)
+        except Exception:
+            snapshot = await self._load(loader, session_factory)
+            return (
+                render_info(snapshot.coins, snapshot.inventory, snapshot.received, snapshot.sent),
+                snapshot.version
+            )
+
+    async def _load(self, loader: Loader, session_factory: SessionFactory) -> InfoSnapshot:
+        # The rebuild is shared by every waiter and outlives a cancelled
+        # caller, so it never borrows a request's session.
+        async with session_factory() as session:
+            return await loader(session)
+
+    async def _rebuild(
+        self,
+        user_id: int,
+        cached: CachedInfo,
+        loader: Loader,
+        session_factory: SessionFactory
+    ) -> tuple[bytes, int]:
+        lock_key = f"{self.base(user_id)}:lock"
+        token = secrets.token_hex(8)
+        locked = await redis_cache.set_if_absent(
+            lock_key, token, expire_ms=int(self.lock_ttl * 1000)
+        )
+
+        if not locked:
+            # Another worker is rebuilding: serve what we have, or wait for its
+            # fill before going to the database ourselves.
+            if cached.body is not None:
+                return cached.body, cached.version
+            deadline = time.monotonic() + self.lock_wait
+            delay = 0.01
+            while time.monotonic() < deadline:
+                await asyncio.sleep(delay)
+                filled = await self.read(user_id)
+                if filled.body is not None:
+                    return filled.body, filled.version
+                delay = min(delay * 2, 0.1)
+
+        try:
+            started = time.monotonic()
+            snapshot = await self._load(loader, session_factory)
+            await self.fill(user_id, cached.generation, snapshot, time.monotonic() - started)
+            return (
+                render_info(snapshot.coins, snapshot.inventory, snapshot.received, snapshot.sent),
+                snapshot.version
+            )
+        finally:
+            if locked:
+                await redis_cache.run_script(LOCK_RELEASE_SCRIPT, keys=[lock_key], args=[token])
+
+    async def record_purchase(self, user_id: int, version: int, item: str, price: int) -> int:
+        base = self.base(user_id)
+        patched = await redis_cache.run_script(
+            PATCH_SCRIPT,
+            keys=[f"{base}:gen"],
+            args=[*self._patch_args(), base, version, -price, item, "", ""]
+        )
+        redis_cache.local_discard(base)
+        return patched
+
+    async def record_transfer(
+        self,
+        sender_id: int,
+        sender_username: str,
+        sender_version: int,
+        recipient_id: int,
+        recipient_username: str,
+        recipient_version: int,
+        amount: int
+    ) -> int:
+        sender_base = self.base(sender_id)
+        recipient_base = self.base(recipient_id)
+        patched = await redis_cache.run_script(
+            PATCH_SCRIPT,
+            keys=[f"{sender_base}:gen", f"{recipient_base}:gen"],
+            args=[
+                *self._patch_args(),
+                sender_base, sender_version, -amount, "", "sent",
+                dump_entry({"toUser": recipient_username, "amount": amount}),
+                recipient_base, recipient_version, amount, "", "received",
+                dump_entry({"fromUser": sender_username, "amount": amount}),
+            ]
+        )
+        redis_cache.local_discard(sender_base)
+        redis_cache.local_discard(recipient_base)
+        return patched
+
+info_cache = InfoCache()
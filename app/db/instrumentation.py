@@ -0,0 +1,77 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from app.core.metrics import db_queries, db_query_duration, db_round_trips
+
+
+class QueryStats:
+    __slots__ = ("count", "round_trips", "time")
+
+    def __init__(self):
+        self.count = 0
+        self.round_trips = 0
+        self.time = 0.0
+
+
+# Set per request by MetricsMiddleware. SQLAlchemy runs the cursor events in
+# a greenlet that shares the calling task's context, so they see it too.
+request_queries: ContextVar[Optional[QueryStats]] = ContextVar("request_queries", default=None)
+
+
+# Listening on the Engine class covers every engine, including the one the
+# tests create. The start time lives on the execution context, which is
+# dropped with the statement whether or not it succeeds.
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.query_started = time.perf_counter()
+
+
+def count_round_trips(count: int):
+    db_round_trips.inc(amount=count)
+    stats = request_queries.get()
+    if stats is not None:
+        stats.round_trips += count
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.query_started
+    db_queries.inc()
+    db_query_duration.observe(elapsed)
+    stats = request_queries.get()
+    if stats is not None:
+        stats.count += 1
+        stats.time += elapsed
+    # asyncpg sends BEGIN lazily, right before the first statement of a
+    # transaction, so a transaction that never executes anything is free.
+    if not conn.info.get("transaction_started"):
+        conn.info["transaction_started"] = True
+        count_round_trips(2)
+    else:
+        count_round_trips(1)
+
+
+@event.listens_for(Engine, "commit")
+@event.listens_for(Engine, "rollback")
+def end_transaction(conn):
+    if conn.info.pop("transaction_started", False):
+        count_round_trips(1)
+
+
+# With pool_pre_ping every checkout of a reused connection first runs BEGIN,
+# an empty query and ROLLBACK on the raw connection, which the cursor events
+# never see. The pool skips the ping for a connection it has just opened, and
+# the checkout event fires right after the ping.
+@event.listens_for(Pool, "connect")
+def mark_fresh(dbapi_connection, connection_record):
+    connection_record.info["fresh"] = True
+
+
+@event.listens_for(Pool, "checkout")
+def count_pre_ping(dbapi_connection, connection_record, connection_proxy):
+    if connection_record.info.pop("fresh", False) or not connection_proxy._pool._pre_ping:
+        return
+    count_round_trips(3)
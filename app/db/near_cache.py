@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class NearCacheEntry:
+    __slots__ = ("value", "size", "expires_at")
+
+    def __init__(self, value: Any, size: int, expires_at: float):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+
+
+class PrefixStats:
+    __slots__ = ("hits", "misses", "evictions")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class NearCache:
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries: OrderedDict[str, NearCacheEntry] = OrderedDict()
+        self._stats: dict[str, PrefixStats] = {}
+
+    def _prefix_stats(self, key: str) -> PrefixStats:
+        prefix = key.split(":", 1)[0]
+        stats = self._stats.get(prefix)
+        if stats is None:
+            stats = self._stats[prefix] = PrefixStats()
+        return stats
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self._prefix_stats(key).misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._prefix_stats(key).hits += 1
+        return entry.value
+
+    def put(self, key: str, value: Any, size: int):
+        if size > self.max_bytes:
+            self.discard(key)
+            return
+        self._remove(key)
+        self._entries[key] = NearCacheEntry(value, size, time.monotonic() + self.ttl)
+        self.size += size
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            evicted, _ = next(iter(self._entries.items()))
+            self._remove(evicted)
+            self._prefix_stats(evicted).evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def discard(self, key: str):
+        self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            prefix: {"hits": s.hits, "misses": s.misses, "evictions": s.evictions}
+            for prefix, s in self._stats.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
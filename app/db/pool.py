@@ -0,0 +1,54 @@
+import time
+from typing import Any
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.core.metrics import Histogram
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait = Histogram()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    # Times every checkout, including the wait for a free connection, and
+    # counts checkouts that gave up after pool_timeout.
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self) -> "InstrumentedPool":
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.wait.observe(time.perf_counter() - started)
+        self.metrics.checkouts += 1
+        return connection
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": self.metrics.checkouts,
+            "timeouts": self.metrics.timeouts,
+            "wait_seconds": {
+                "count": self.metrics.wait.count,
+                "sum": self.metrics.wait.sum,
+                "p50": self.metrics.wait.quantile(0.5),
+                "p99": self.metrics.wait.quantile(0.99),
+                "buckets": self.metrics.wait.cumulative()
+            }
+        }
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+from collections.abc import Callable
+from typing import Any, Optional
+import asyncpg
+from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from app.core.config import settings
+from app.core.metrics import db_read_sessions, db_replica_fallbacks, registry
+from app.db.base import engine, make_engine
+from app.db.cache import redis_cache
+from app.models.models import User
+
+logger = logging.getLogger(__name__)
+
+# asyncpg errors raised while connecting are not wrapped in DBAPIError; an
+# unreachable host is an OSError. TimeoutError covers both asyncpg's own
+# timeouts and the ones set around replica calls here.
+REPLICA_ERRORS = (
+    DBAPIError, OSError, TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError
+)
+
+# Seconds behind the primary; 0 when nothing is left to replay, and for a
+# URL that points at a primary.
+LAG_QUERY = text("""
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+""")
+
+
+class Replica:
+    __slots__ = ("engine", "lag", "healthy")
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        # Unknown until the first check: a replica is not used before that.
+        self.lag: Optional[float] = None
+        self.healthy = False
+
+
+class ReadSession:
+    # Statements that fail or take longer than `timeout` on a replica are
+    # retried once on a new primary session and the replica leaves the
+    # rotation until the next successful lag check.
+    def __init__(self, replica: Optional[Replica], primary: AsyncEngine, timeout: float):
+        self.replica = replica
+        self.primary = primary
+        self.timeout = timeout
+        self.session = AsyncSession(
+            bind=replica.engine if replica is not None else primary,
+            expire_on_commit=False
+        )
+
+    async def execute(self, *args: Any, **kwargs: Any):
+        return await self._run("execute", *args, **kwargs)
+
+    async def stream(self, *args: Any, **kwargs: Any):
+        return await self._run("stream", *args, **kwargs)
+
+    async def _run(self, method: str, *args: Any, **kwargs: Any):
+        if self.replica is None:
+            return await getattr(self.session, method)(*args, **kwargs)
+        try:
+            return await asyncio.wait_for(
+                getattr(self.session, method)(*args, **kwargs), timeout=self.timeout
+            )
+        except REPLICA_ERRORS:
+            logger.warning("Replica read failed, retrying on the primary", exc_info=True)
+            self.replica.healthy = False
+            await self.use_primary("error")
+            return await getattr(self.session, method)(*args, **kwargs)
+
+    async def use_primary(self, reason: str):
+        await self.session.close()
+        self.replica = None
+        self.session = AsyncSession(bind=self.primary, expire_on_commit=False)
+        db_replica_fallbacks.inc(reason)
+
+    async def close(self):
+        # Nothing is written, so the transaction is rolled back.
+        await self.session.close()
+
+    async def __aenter__(self) -> "ReadSession":
+        return self
+
+    async def __aexit__(self, *exc_info: Any):
+        await self.close()
+
+
+class ReplicaRouter:
+    def __init__(
+        self,
+        urls: list[str],
+        max_lag: float,
+        check_interval: float,
+        read_your_writes_ttl: int,
+        timeout: float,
+        primary: AsyncEngine = engine
+    ):
+        self.primary = primary
+        # asyncpg's connect and command timeouts also bound the ROLLBACK that
+        # runs when a timed out replica connection is closed.
+        self.replicas = [
+            Replica(make_engine(url, connect_args={"timeout": timeout, "command_timeout": timeout}))
+            for url in urls
+        ]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self.read_your_writes_ttl = read_your_writes_ttl
+        self._next = 0
+        self._monitor: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def pick(self) -> Optional[Replica]:
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self._next % len(self.replicas)]
+            self._next += 1
+            if replica.healthy and replica.lag is not None and replica.lag <= self.max_lag:
+                return replica
+        return None
+
+    def session(self) -> ReadSession:
+        replica = self.pick()
+        db_read_sessions.inc("replica" if replica is not None else "primary")
+        return ReadSession(replica, self.primary, self.timeout)
+
+    def session_factory(self) -> Callable[[], ReadSession]:
+        return self.session
+
+    async def check(self):
+        await asyncio.gather(*(self._check(replica) for replica in self.replicas))
+
+    async def _check(self, replica: Replica):
+        try:
+            lag = await asyncio.wait_for(self._lag(replica), timeout=self.timeout)
+        except REPLICA_ERRORS:
+            logger.warning("Replica lag check failed", exc_info=True)
+            replica.healthy = False
+            return
+        replica.lag = float(lag)
+        replica.healthy = True
+
+    async def _lag(self, replica: Replica) -> Any:
+        async with replica.engine.connect() as conn:
+            return await conn.scalar(LAG_QUERY)
+
+    async def _monitor_lag(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.check_interval)
+
+    async def start(self):
+        if self.enabled and self._monitor is None:
+            await self.check()
+            self._monitor = asyncio.create_task(self._monitor_lag())
+
+    async def close(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    # Read-your-writes: users.version is bumped by every purchase and
+    # transfer, so a replica has seen a user's write once it returns at least
+    # the version that write produced.
+    def _written_key(self, user_id: int) -> str:
+        return f"written_version:{user_id}"
+
+    async def record_write(self, user_id: int, version: int):
+        if self.enabled:
+            await redis_cache.command(
+                "SET", self._written_key(user_id), version, "EX", self.read_your_writes_ttl
+            )
+
+    async def fresh(self, session: ReadSession, user_id: int, version: Optional[int] = None) -> bool:
+        # False when the replica is behind the user's last write; the session
+        # is then moved to the primary. Without a version the replica is asked.
+        if session.replica is None:
+            return True
+        written = await redis_cache.command("GET", self._written_key(user_id))
+        if written is None:
+            return True
+        if version is None:
+            result = await session.execute(select(User.version).where(User.id == user_id))
+            version = result.scalar()
+        if version is not None and version >= int(written):
+            return True
+        await session.use_primary("stale")
+        return False
+
+    async def confirm(self, session: ReadSession, user_id: int, version: int) -> bool:
+        # For reads that are cached: a snapshot from a replica is only kept if
+        # the primary is at the same version, whether or not the write that
+        # changed it was recorded. Otherwise the session moves to the primary.
+        if session.replica is None:
+            return True
+        async with self.primary.connect() as conn:
+            current = await conn.scalar(select(User.version).where(User.id == user_id))
+        if current == version:
+            return True
+        await session.use_primary("stale")
+        return False
+
+replica_router = ReplicaRouter(
+    settings.DB_REPLICA_URLS,
+    settings.DB_REPLICA_MAX_LAG,
+    settings.DB_REPLICA_CHECK_INTERVAL,
+    settings.DB_READ_YOUR_WRITES_TTL,
+    settings.DB_REPLICA_TIMEOUT
+)
+
+registry.gauge(
+    "db_replica_lag_seconds", "Replication lag seen by the last check", ("replica",),
+    collect=lambda: {
+        (str(index),): replica.lag
+        for index, replica in enumerate(replica_router.replicas)
+        if replica.lag is not None
+    }
+)
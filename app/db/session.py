@@ -1,6 +1,7 @@
-from typing import AsyncGenerator
+from collections.abc import AsyncGenerator, Callable
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.base import AsyncSessionLocal
+from app.db.replicas import ReadSession, replica_router
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
@@ -12,4 +13,13 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             raise
         finally:
             await session.close()
-    
\ No newline at end of file
+
+async def get_read_db() -> AsyncGenerator[ReadSession, None]:
+    # Read-only routes: a replica when one is in sync, else the primary.
+    async with replica_router.session() as session:
+        yield session
+
+def get_read_session_factory() -> Callable[[], ReadSession]:
+    # For reads that outlive the request's dependencies: a streaming body,
+    # which is sent after they close, or the shared /api/info rebuild.
+    return replica_router.session_factory()
@@ -0,0 +1,101 @@
+import json
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+# Every encoded value starts with a three byte header: MAGIC, the serializer id
+# and a flags byte. MAGIC can never start a JSON document, so values written
+# before the header existed are still read as plain JSON. A value whose
+# serializer or flags this worker does not know is treated as a miss, which
+# lets codecs change during a rolling deploy without flushing Redis.
+MAGIC = 0x01
+FLAG_ZLIB = 0x01
+
+
+class Serializer(ABC):
+    id: int
+    name: str
+
+    @abstractmethod
+    def dumps(self, value: Any) -> bytes: ...
+
+    @abstractmethod
+    def loads(self, data: bytes) -> Any: ...
+
+
+class JsonSerializer(Serializer):
+    id = 1
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class MsgpackSerializer(Serializer):
+    id = 2
+    name = "msgpack"
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+SERIALIZERS: dict[int, Serializer] = {JsonSerializer.id: JsonSerializer()}
+if msgpack is not None:
+    SERIALIZERS[MsgpackSerializer.id] = MsgpackSerializer()
+
+
+def get_serializer(name: str) -> Serializer:
+    for serializer in SERIALIZERS.values():
+        if serializer.name == name:
+            return serializer
+    # msgpack is optional: fall back to compact JSON when it is not installed.
+    return SERIALIZERS[JsonSerializer.id]
+
+
+class ValueCodec:
+    def __init__(
+        self,
+        serializer: Serializer,
+        compress_threshold: Optional[int] = None,
+        compress_level: int = 1
+    ):
+        self.serializer = serializer
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+    def encode(self, value: Any) -> bytes:
+        body = self.serializer.dumps(value)
+        flags = 0
+        if self.compress_threshold is not None and len(body) >= self.compress_threshold:
+            compressed = zlib.compress(body, self.compress_level)
+            if len(compressed) < len(body):
+                body, flags = compressed, FLAG_ZLIB
+        return bytes((MAGIC, self.serializer.id, flags)) + body
+
+    @staticmethod
+    def decode(data: bytes) -> Optional[Any]:
+        if not data:
+            return None
+        if data[0] != MAGIC:
+            return json.loads(data)
+
+        serializer = SERIALIZERS.get(data[1])
+        flags = data[2]
+        if serializer is None or flags & ~FLAG_ZLIB:
+            return None
+        body = data[3:]
+        if flags & FLAG_ZLIB:
+            body = zlib.decompress(body)
+        return serializer.loads(body)
@@ -1,10 +1,32 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import auth, info, shop, transactions
+from app.api import auth, history, info, metrics, shop, transactions
 from app.core.config import settings
+from app.core.hashing import password_hasher
+from app.db.cache import redis_cache
+from app.db.replicas import replica_router
+from app.middleware.capture import CaptureLog, TrafficCapture
+from app.middleware.metrics import MetricsMiddleware
 from app.middleware.rate_limiter import RateLimiter
 
-app = FastAPI(title=settings.PROJECT_NAME, version=settings.PROJECT_VERSION)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await redis_cache.init()
+    await replica_router.start()
+    yield
+    await replica_router.close()
+    await redis_cache.close()
+    password_hasher.shutdown()
+    if capture_log is not None:
+        capture_log.close()
+
+app = FastAPI(
+    title=settings.PROJECT_NAME,
+    version=settings.PROJECT_VERSION,
+    lifespan=lifespan
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,6 +40,8 @@ app.middleware("http")(RateLimiter(
     max_requests={
         "/api/auth": 50,
         "/api/info": 2000,
+        "/api/history/export": 5,
+        "/api/history": 200,
         "/api/buy": 100,
         "/api/sendCoin": 100,
     },
@@ -27,7 +51,25 @@ app.middleware("http")(RateLimiter(
     ban_duration_seconds=10
 ))
 
+capture_log = None
+if settings.CAPTURE_ENABLED:
+    # Outside the rate limiter: rejected requests are part of the traffic.
+    capture_log = CaptureLog(
+        settings.CAPTURE_PATH, settings.CAPTURE_MAX_BYTES, settings.CAPTURE_BACKUP_COUNT
+    )
+    app.add_middleware(
+        TrafficCapture,
+        log=capture_log,
+        key=(settings.CAPTURE_KEY or settings.SECRET_KEY).get_secret_value().encode()
+    )
+
 app.include_router(auth.router, prefix="/api", tags=["auth"])
 app.include_router(info.router, prefix="/api", tags=["info"])
+app.include_router(history.router, prefix="/api", tags=["history"])
 app.include_router(shop.router, prefix="/api", tags=["shop"])
 app.include_router(transactions.router, prefix="/api", tags=["transactions"])
+
+if settings.METRICS_ENABLED:
+    # Added last, so it wraps the rate limiter and sees rejected requests too.
+    app.add_middleware(MetricsMiddleware, query_headers=settings.DB_QUERY_HEADERS)
+    app.include_router(metrics.router)
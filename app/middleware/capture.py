@@ -0,0 +1,145 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import time
+from logging.handlers import QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Any, Optional
+from jose import JWTError, jwt
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Body fields that are never written, not even hashed.
+SECRET_FIELDS = {"password"}
+REDACTED = "<redacted>"
+
+
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg, separators=(",", ":"))
+
+
+# Records go through a bounded queue to a writer thread, so a slow disk
+# costs dropped records rather than event loop time; serialization happens
+# on that thread too.
+class CaptureLog:
+    def __init__(self, path: str, max_bytes: int, backup_count: int, queue_size: int = 10000):
+        path = path.format(pid=os.getpid())
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        handler.setFormatter(JsonLineFormatter())
+        self.path = path
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._listener = QueueListener(self._queue, handler)
+        self._listener.start()
+
+    def write(self, record: dict[str, Any]):
+        try:
+            self._queue.put_nowait(logging.makeLogRecord({"msg": record}))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+
+
+class Anonymizer:
+    def __init__(self, key: bytes):
+        self.key = key
+
+    def hash(self, value: str) -> str:
+        # Keyed, so captured hashes of guessable usernames cannot be reversed
+        # without the key; the same username always maps to the same hash.
+        return "#" + hmac.new(self.key, value.encode(), hashlib.sha256).hexdigest()[:16]
+
+    def principal(self, scope: Scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                _, _, token = value.decode("latin-1").partition(" ")
+                try:
+                    subject = jwt.get_unverified_claims(token).get("sub")
+                except JWTError:
+                    return None
+                return self.hash(subject) if isinstance(subject, str) else None
+        return None
+
+    def shape(self, value: Any) -> Any:
+        # Numbers and flags are kept, strings are hashed: enough to replay the
+        # request against provisioned accounts without storing user data.
+        if isinstance(value, dict):
+            return {
+                key: REDACTED if key in SECRET_FIELDS else self.shape(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [self.shape(item) for item in value]
+        if isinstance(value, str):
+            return self.hash(value)
+        return value
+
+
+class TrafficCapture:
+    def __init__(self, app: ASGIApp, log: CaptureLog, key: bytes, body_limit: int = 4096):
+        self.app = app
+        self.log = log
+        self.anonymizer = Anonymizer(key)
+        self.body_limit = body_limit
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        arrived = time.time()
+        started = time.perf_counter()
+        status = 500
+        body = bytearray()
+        size = 0
+
+        async def receive_with_body() -> Message:
+            nonlocal size
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size <= self.body_limit:
+                    body.extend(chunk)
+            return message
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_with_body, send_with_status)
+        finally:
+            route = scope.get("route")
+            self.log.write({
+                "ts": round(arrived, 6),
+                "method": scope["method"],
+                "route": route.path if route is not None else "unmatched",
+                "path": scope["path"],
+                "query": scope["query_string"].decode("latin-1"),
+                "principal": self.anonymizer.principal(scope),
+                "body": self.body_shape(body, size),
+                "size": size,
+                "status": status,
+                "ms": round((time.perf_counter() - started) * 1000, 3),
+            })
+
+    def body_shape(self, body: bytearray, size: int) -> Any:
+        if not size or size > self.body_limit:
+            return None
+        try:
+            return self.anonymizer.shape(json.loads(body))
+        except ValueError:
+            return None
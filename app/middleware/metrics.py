@@ -0,0 +1,58 @@
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.metrics import (
+    db_queries_per_request,
+    db_round_trips_per_request,
+    db_time_per_request,
+    http_request_duration,
+    http_requests_in_flight,
+)
+from app.db.instrumentation import QueryStats, request_queries
+
+
+# Plain ASGI middleware rather than @app.middleware("http"): it adds no
+# extra task or body wrapping to every request.
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, query_headers: bool = False):
+        self.app = app
+        self.query_headers = query_headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        queries = QueryStats()
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.query_headers:
+                    # Statements run while streaming the body are not counted.
+                    message["headers"] = [
+                        *message.get("headers", ()),
+                        (b"x-db-queries", str(queries.count).encode()),
+                        (b"x-db-round-trips", str(queries.round_trips).encode()),
+                        (b"x-db-time", f"{queries.time * 1000:.3f}ms".encode()),
+                    ]
+            await send(message)
+
+        token = request_queries.set(queries)
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_flight.dec()
+            request_queries.reset(token)
+            # FastAPI stores the matched route in the scope; requests that
+            # never reach routing (rate limited, 404) share one label.
+            route = scope.get("route")
+            template = route.path if route is not None else "unmatched"
+            http_request_duration.observe(elapsed, scope["method"], template, str(status))
+            db_queries_per_request.observe(queries.count)
+            db_round_trips_per_request.observe(queries.round_trips)
+            db_time_per_request.observe(queries.time)
@@ -1,9 +1,99 @@
-from typing import Optional
+import asyncio
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
 from fastapi import Request
 from fastapi.responses import JSONResponse
+from redis.exceptions import RedisError
+from starlette.routing import Match
+from app.core.metrics import rate_limit_bans, rate_limit_rejections
 from app.db.cache import redis_cache
 
 
+# GCRA: the key stores the theoretical arrival time (TAT) in microseconds.
+# ARGV is {emission_us, tolerance_us, requested, refund}: up to `requested`
+# tokens are leased at once and `refund` unused tokens from an expired lease
+# are given back first. Returns {status, remaining, retry_after_us, granted};
+# status is 1 allowed, 0 limited, -1 banned. An emission interval of 0 only
+# checks the ban. Redis TIME is used so every worker shares one clock.
+RATE_LIMIT_SCRIPT = """
+local ban_ttl = redis.call('PTTL', KEYS[1])
+if ban_ttl > 0 then
+    return {-1, 0, ban_ttl * 1000, 0}
+end
+
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000000 + tonumber(now[2])
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local refund = tonumber(ARGV[4])
+if emission == 0 then
+    return {1, 0, 0, 0}
+end
+
+local tat = tonumber(redis.call('GET', KEYS[2]))
+if tat and refund > 0 then
+    tat = tat - refund * emission
+end
+if not tat or tat < now then
+    tat = now
+end
+
+local available = math.floor((now + tolerance - tat) / emission)
+if available < 1 then
+    redis.call('SET', KEYS[2], string.format('%d', tat), 'PX', math.ceil((tat - now) / 1000))
+    return {0, 0, tat + emission - tolerance - now, 0}
+end
+
+local granted = math.min(requested, available)
+local new_tat = tat + granted * emission
+redis.call('SET', KEYS[2], string.format('%d', new_tat), 'PX', math.ceil((new_tat - now) / 1000))
+return {1, available - granted, 0, granted}
+"""
+
+RECORD_ERROR_SCRIPT = """
+local errors = redis.call('INCR', KEYS[1])
+if errors == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+if errors >= tonumber(ARGV[2]) then
+    redis.call('SET', KEYS[2], '1', 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class RateLimitDecision(NamedTuple):
+    allowed: bool
+    banned: bool = False
+    limit: Optional[int] = None
+    remaining: Optional[int] = None
+    retry_after: float = 0.0
+
+
+class LocalBucket:
+    __slots__ = ("tokens", "expires_at", "remaining", "blocked_until", "banned", "lock")
+
+    def __init__(self, remaining: int):
+        self.tokens = 0
+        self.expires_at = 0.0
+        self.remaining = remaining
+        self.blocked_until = 0.0
+        self.banned = False
+        self.lock = asyncio.Lock()
+
+
+# Hybrid mode: each worker leases `lease_fraction` of a route's limit from
+# Redis and spends it locally until the lease expires after `lease_ttl`
+# seconds; unused tokens are refunded with the next lease. Once Redis reports
+# less than one lease left, the worker leases one token per request (strict
+# mode). Leased tokens are already debited in Redis, so the long-run rate is
+# exact; the error is temporal: in any single window a client can be admitted
+# up to limit + workers * lease_size requests, and a ban set by another worker
+# is noticed at the next lease, at most `lease_ttl` seconds later. A ban set by
+# this worker applies to its leases at once.
 class RateLimiter:
     def __init__(
         self,
@@ -12,6 +102,10 @@ class RateLimiter:
         error_window_seconds: int = 60,
         max_errors: int = 50,
         ban_duration_seconds: int = 5,
+        max_cached_paths: int = 4096,
+        lease_fraction: float = 0.1,
+        lease_ttl: float = 1.0,
+        max_buckets: int = 100_000,
     ):
         self.rate_limits = max_requests or {
             "/api/auth": 50,
@@ -23,79 +117,200 @@ class RateLimiter:
         self.error_window_seconds = error_window_seconds
         self.max_errors = max_errors
         self.ban_duration_seconds = ban_duration_seconds
+        self.max_cached_paths = max_cached_paths
+        self.lease_fraction = lease_fraction
+        self.lease_ttl = lease_ttl
+        self.max_buckets = max_buckets
+        self.local_decisions = 0
+        self.redis_decisions = 0
+        self._templates: dict[str, str] = {}
+        self._buckets: OrderedDict[tuple[str, str], LocalBucket] = OrderedDict()
+
+    def route_template(self, request: Request) -> str:
+        path = request.url.path
+        template = self._templates.get(path)
+        if template is not None:
+            return template
+
+        for route in request.app.router.routes:
+            match, _ = route.matches(request.scope)
+            if match != Match.NONE:
+                template = route.path
+                break
+        else:
+            return path
 
-    async def is_banned(self, client_ip: str) -> bool:
-        ban_key = f"ban:{client_ip}"
-        return bool(await redis_cache.get(ban_key))
+        if len(self._templates) < self.max_cached_paths:
+            self._templates[path] = template
+        return template
+
+    def limit_for(self, template: str) -> Optional[int]:
+        for path, limit in self.rate_limits.items():
+            if template.startswith(path):
+                return limit
+        return None
 
     async def record_error(self, client_ip: str) -> bool:
-        error_key = f"errors:{client_ip}"
+        try:
+            banned = await redis_cache.run_script(
+                RECORD_ERROR_SCRIPT,
+                keys=[f"errors:{client_ip}", f"ban:{client_ip}"],
+                args=[self.error_window_seconds, self.max_errors, self.ban_duration_seconds]
+            )
+        except RedisError:
+            return False
+        if banned:
+            self._ban_locally(client_ip)
+        return bool(banned)
 
-        errors = await redis_cache.get(error_key)
-        current_errors = int(errors) if errors else 0
+    def _ban_locally(self, client_ip: str):
+        # Leased tokens would otherwise keep admitting the client on this
+        # worker until the lease expires.
+        blocked_until = time.monotonic() + self.ban_duration_seconds
+        for (_, ip), bucket in self._buckets.items():
+            if ip == client_ip:
+                bucket.banned = True
+                bucket.blocked_until = blocked_until
 
-        current_errors += 1
-        await redis_cache.set(
-            error_key,
-            current_errors,
-            expire=self.error_window_seconds
-        )
+    def lease_size(self, rate_limit: int) -> int:
+        return max(int(rate_limit * self.lease_fraction), 1)
+
+    def _bucket(self, key: tuple[str, str], rate_limit: int) -> LocalBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = LocalBucket(rate_limit)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
 
-        if current_errors >= self.max_errors:
-            ban_key = f"ban:{client_ip}"
-            await redis_cache.set(
-                ban_key,
-                "1",
-                expire=self.ban_duration_seconds
+    def _local_decision(
+        self,
+        bucket: LocalBucket,
+        rate_limit: int,
+        now: float
+    ) -> Optional[RateLimitDecision]:
+        if bucket.blocked_until > now:
+            return RateLimitDecision(
+                allowed=False,
+                banned=bucket.banned,
+                limit=rate_limit,
+                remaining=0,
+                retry_after=bucket.blocked_until - now
             )
-            return True
-        return False
+        if bucket.tokens > 0 and bucket.expires_at > now:
+            bucket.tokens -= 1
+            return RateLimitDecision(
+                allowed=True,
+                limit=rate_limit,
+                remaining=bucket.tokens + bucket.remaining
+            )
+        return None
+
+    async def _lease(
+        self,
+        template: str,
+        client_ip: str,
+        rate_limit: Optional[int],
+        requested: int,
+        refund: int
+    ) -> tuple[int, int, float, int]:
+        window_us = self.window_seconds * 1_000_000
+        emission_us = window_us // rate_limit if rate_limit else 0
+        self.redis_decisions += 1
+        status, remaining, retry_after_us, granted = await redis_cache.run_script(
+            RATE_LIMIT_SCRIPT,
+            keys=[f"ban:{client_ip}", f"ratelimit:{template}:{client_ip}"],
+            args=[emission_us, window_us, requested, refund]
+        )
+        return status, remaining, retry_after_us / 1_000_000, granted
 
     async def check_rate_limit(
         self,
-        endpoint: str,
+        template: str,
         client_ip: str
-    ) -> Optional[int]:
-        rate_limit = None
-        for path, limit in self.rate_limits.items():
-            if endpoint.startswith(path):
-                rate_limit = limit
-                break
-
+    ) -> RateLimitDecision:
+        rate_limit = self.limit_for(template)
         if not rate_limit:
-            return None
+            try:
+                status, _, retry_after, _ = await self._lease(template, client_ip, None, 0, 0)
+            except RedisError:
+                return RateLimitDecision(allowed=True)
+            return RateLimitDecision(
+                allowed=status == 1,
+                banned=status == -1,
+                retry_after=retry_after
+            )
 
-        key = f"ratelimit:{endpoint}:{client_ip}"
+        bucket = self._bucket((template, client_ip), rate_limit)
+        decision = self._local_decision(bucket, rate_limit, time.monotonic())
+        if decision is not None:
+            self.local_decisions += 1
+            return decision
 
-        try:
-            current_count = await redis_cache.get(key)
-            if not current_count:
-                await redis_cache.set(key, 1, expire=self.window_seconds)
-                return rate_limit - 1
+        async with bucket.lock:
+            now = time.monotonic()
+            decision = self._local_decision(bucket, rate_limit, now)
+            if decision is not None:
+                self.local_decisions += 1
+                return decision
 
-            count = int(current_count)
-            if count >= rate_limit:
-                return 0
+            lease = self.lease_size(rate_limit)
+            requested = lease if bucket.remaining >= lease else 1
+            refund, bucket.tokens = bucket.tokens, 0
+            try:
+                status, remaining, retry_after, granted = await self._lease(
+                    template, client_ip, rate_limit, requested, refund
+                )
+            except RedisError:
+                return RateLimitDecision(allowed=True, limit=rate_limit)
 
-            await redis_cache.set(key, count + 1, expire=self.window_seconds)
-            return rate_limit - (count + 1)
-        except:
-            return rate_limit
+            bucket.remaining = remaining
+            if status != 1:
+                bucket.banned = status == -1
+                bucket.blocked_until = now + retry_after
+                return RateLimitDecision(
+                    allowed=False,
+                    banned=bucket.banned,
+                    limit=rate_limit,
+                    remaining=0,
+                    retry_after=retry_after
+                )
+
+            bucket.banned = False
+            bucket.tokens = granted - 1
+            bucket.expires_at = now + self.lease_ttl
+            return RateLimitDecision(
+                allowed=True,
+                limit=rate_limit,
+                remaining=bucket.tokens + remaining
+            )
+
+    def too_many_requests(self, detail: str, retry_after: float) -> JSONResponse:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": detail},
+            headers={"Retry-After": str(max(int(retry_after + 0.999), 1))}
+        )
 
     async def __call__(self, request: Request, call_next):
         client_ip = request.client.host
+        template = self.route_template(request)
+        decision = await self.check_rate_limit(template, client_ip)
 
-        if await self.is_banned(client_ip):
-            return JSONResponse(
-                status_code=429,
-                content={"detail": "Too many errors. Please try again later."}
+        if decision.banned:
+            rate_limit_rejections.inc(template, "banned")
+            return self.too_many_requests(
+                "Too many errors. Please try again later.",
+                decision.retry_after
             )
-
-        remaining = await self.check_rate_limit(request.url.path, client_ip)
-        if remaining is not None and remaining < 0:
-            return JSONResponse(
-                status_code=429,
-                content={"detail": "Rate limit exceeded. Please try again later."}
+        if not decision.allowed:
+            rate_limit_rejections.inc(template, "limited")
+            return self.too_many_requests(
+                "Rate limit exceeded. Please try again later.",
+                decision.retry_after
             )
 
         response = await call_next(request)
@@ -103,9 +318,13 @@ class RateLimiter:
         if response.status_code >= 500:
             should_ban = await self.record_error(client_ip)
             if should_ban:
-                return JSONResponse(
-                    status_code=429,
-                    content={"detail": "Too many errors. Please try again later."}
+                rate_limit_bans.inc()
+                return self.too_many_requests(
+                    "Too many errors. Please try again later.",
+                    self.ban_duration_seconds
                 )
 
+        if decision.limit is not None:
+            response.headers["X-RateLimit-Limit"] = str(decision.limit)
+            response.headers["X-RateLimit-Remaining"] = str(decision.remaining)
         return response
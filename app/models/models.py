@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import (
+    BigInteger, Column, Integer, String, ForeignKey, DateTime, Index, UniqueConstraint
+)
 from sqlalchemy.sql import func
 from app.db.base import Base
 
 
 class Inventory(Base):
     __tablename__ = "inventory"
+    __table_args__ = (
+        UniqueConstraint("user_id", "item_name", name="uq_inventory_user_item"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -15,12 +20,16 @@ class Inventory(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_to_user_created", "to_user_id", "created_at", "id"),
+        Index("ix_transactions_from_user_created", "from_user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     from_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     to_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     amount = Column(Integer, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
 
 class User(Base):
@@ -30,5 +39,6 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
     coins = Column(Integer, default=1000, nullable=False)
+    version = Column(BigInteger, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
\ No newline at end of file
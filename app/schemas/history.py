@@ -0,0 +1,19 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel
+from app.schemas.info import ReceivedTransactionInfo, SentTransactionInfo
+
+
+class ReceivedHistoryEntry(ReceivedTransactionInfo):
+    createdAt: datetime
+
+class SentHistoryEntry(SentTransactionInfo):
+    createdAt: datetime
+
+class ReceivedHistoryPage(BaseModel):
+    items: list[ReceivedHistoryEntry]
+    nextCursor: Optional[str] = None
+
+class SentHistoryPage(BaseModel):
+    items: list[SentHistoryEntry]
+    nextCursor: Optional[str] = None
@@ -0,0 +1,7 @@
+from typing import Annotated
+from pydantic import BaseModel, Field
+
+
+class CheckoutRequest(BaseModel):
+    # Quantities fit inventory.quantity; their total is checked as a bigint.
+    items: dict[str, Annotated[int, Field(gt=0, lt=2**31)]] = Field(min_length=1)
@@ -0,0 +1,101 @@
+import asyncio
+import random
+from typing import NamedTuple
+from fastapi import HTTPException
+from sqlalchemy import case, insert, or_, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.identity import identity_cache
+from app.models.models import Transaction, User
+
+
+RETRYABLE_SQLSTATES = {"40001", "40P01"}
+
+
+class TransferResult(NamedTuple):
+    recipient_id: int
+    sender_version: int
+    recipient_version: int
+
+
+def _is_retryable(exc: DBAPIError) -> bool:
+    return getattr(exc.orig, "sqlstate", None) in RETRYABLE_SQLSTATES
+
+
+async def _transfer_once(
+    db: AsyncSession,
+    sender_id: int,
+    recipient_username: str,
+    amount: int
+) -> TransferResult:
+    # Both rows are locked by one statement in primary key order, so opposite
+    # transfers between the same pair of users queue up instead of deadlocking.
+    result = await db.execute(
+        select(User.id, User.username, User.coins)
+        .where(or_(User.id == sender_id, User.username == recipient_username))
+        .order_by(User.id)
+        .with_for_update()
+    )
+    accounts = {row.id: row for row in result.all()}
+
+    sender = accounts.get(sender_id)
+    recipient = next(
+        (row for row in accounts.values() if row.username == recipient_username),
+        None
+    )
+    if sender is None:
+        # The token outlived its user.
+        await db.rollback()
+        identity_cache.discard(sender_id)
+        raise HTTPException(status_code=401, detail="User not found")
+    if recipient is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Recipient not found")
+    if sender.id == recipient.id:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Cannot send coins to yourself")
+    if sender.coins < amount:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Insufficient coins")
+
+    recorded = (
+        insert(Transaction)
+        .values(from_user_id=sender.id, to_user_id=recipient.id, amount=amount)
+        .cte("recorded")
+    )
+    result = await db.execute(
+        update(User)
+        .where(User.id.in_([sender.id, recipient.id]))
+        .values(
+            coins=case(
+                (User.id == sender.id, User.coins - amount),
+                else_=User.coins + amount
+            ),
+            version=User.version + 1
+        )
+        .returning(User.id, User.version)
+        .add_cte(recorded)
+    )
+    versions = dict(result.all())
+    return TransferResult(recipient.id, versions[sender.id], versions[recipient.id])
+
+
+async def transfer_coins(
+    db: AsyncSession,
+    sender_id: int,
+    recipient_username: str,
+    amount: int,
+    max_attempts: int = 5,
+    base_delay: float = 0.01
+) -> TransferResult:
+    for attempt in range(1, max_attempts + 1):
+        try:
+            transfer = await _transfer_once(db, sender_id, recipient_username, amount)
+            await db.commit()
+            return transfer
+        except DBAPIError as exc:
+            await db.rollback()
+            if not _is_retryable(exc) or attempt == max_attempts:
+                raise
+            delay = base_delay * 2 ** (attempt - 1)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))  # noqa: S311
@@ -0,0 +1,95 @@
+"""Size and speed of the RedisCache value codecs on /api/info payloads.
+
+Builds InfoResponse documents with growing coin histories and reports the
+stored size and encode/decode time of every serializer, with and without
+compression:
+
+    python -m tests.benchmarks.codecs
+    python -m tests.benchmarks.codecs --history 10 100 1000 5000 --runs 500
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from app.core.config import MERCH_PRICES
+from app.db.value_codecs import SERIALIZERS, ValueCodec
+from app.schemas.info import InfoResponse
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", type=int, nargs="+", default=[0, 10, 100, 1000])
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--threshold", type=int, default=1024)
+    parser.add_argument("--level", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def info_payload(history: int, rng: random.Random) -> dict:
+    def username() -> str:
+        return f"user_{rng.randint(1, 100_000)}"
+
+    return InfoResponse.model_validate({
+        "coins": rng.randint(0, 1000),
+        "inventory": [
+            {"type": item, "quantity": rng.randint(1, 20)}
+            for item in rng.sample(sorted(MERCH_PRICES), 5)
+        ],
+        "coinHistory": {
+            "received": [
+                {"fromUser": username(), "amount": rng.randint(1, 500)}
+                for _ in range(history)
+            ],
+            "sent": [
+                {"toUser": username(), "amount": rng.randint(1, 500)}
+                for _ in range(history)
+            ]
+        }
+    }).model_dump()
+
+
+class LegacyJson:
+    # What RedisCache stored before codecs: json.dumps with default separators.
+    def encode(self, value) -> bytes:
+        return json.dumps(value).encode()
+
+    def decode(self, data: bytes):
+        return json.loads(data)
+
+
+def timed(func, arg, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func(arg)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1_000_000
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    codecs = {"legacy json": LegacyJson()}
+    for serializer in SERIALIZERS.values():
+        codecs[serializer.name] = ValueCodec(serializer)
+        codecs[f"{serializer.name}+zlib"] = ValueCodec(serializer, args.threshold, args.level)
+
+    print(f"{'history':>8} {'codec':<14} {'bytes':>10} {'ratio':>6} {'encode us':>10} {'decode us':>10}")
+    for history in args.history:
+        payload = info_payload(history, rng)
+        baseline = None
+        for name, codec in codecs.items():
+            encoded = codec.encode(payload)
+            assert codec.decode(encoded) == payload
+            baseline = baseline or len(encoded)
+            print(
+                f"{history:>8} {name:<14} {len(encoded):>10} {len(encoded) / baseline:>6.2f} "
+                f"{timed(codec.encode, payload, args.runs):>10.1f} "
+                f"{timed(codec.decode, encoded, args.runs):>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""In-process benchmarks of the API endpoints with regression thresholds.
+
+Drives the ASGI app through httpx.ASGITransport, as the tests do, against the
+Postgres and Redis from the settings. Tables are created in a separate schema
+that is dropped afterwards, but the Redis database is flushed: point
+REDIS_URL at a scratch instance, as for the test suite, and pass --flush to
+confirm. Without it the benchmark refuses to run.
+
+    REDIS_URL=redis://localhost:6379/15 python -m tests.benchmarks.endpoints --flush --save
+    python -m tests.benchmarks.endpoints --flush --tolerance 0.25 --output results.json
+
+Every scenario reports throughput, p50/p99 latency, the peak memory allocated
+by one request and the SQL statements and round trips per request. When the
+baseline file exists the run exits with status 1 if a metric is worse than the
+baseline by more than --tolerance; statement and round trip counts must not
+grow at all. Timings depend on the machine, so record the baseline on the
+machine that compares against it.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+# Read when app.main builds the middleware stack.
+os.environ.setdefault("DB_QUERY_HEADERS", "true")
+
+from httpx import ASGITransport, AsyncClient, Response
+from sqlalchemy import insert, text
+from app.core.config import settings
+from app.core.hashing import password_hasher, pwd_context
+from app.core.security import create_access_token
+from app.db.base import AsyncSessionLocal, Base, engine
+from app.db.cache import redis_cache
+from app.db.replicas import replica_router
+from app.main import app
+from app.middleware.rate_limiter import RateLimiter
+from app.models.models import User
+
+
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "endpoints.json"
+PASSWORD = "benchmark"
+# Accounts behind the warm scenarios; every other account is used once.
+REGULARS = 64
+
+# Metric -> whether a higher value is better. Counts are compared exactly.
+TIMED_METRICS = {"throughput_rps": True, "p50_ms": False, "p99_ms": False, "alloc_kib": False}
+COUNT_METRICS = ("statements", "round_trips")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--auth-requests", type=int, default=50)
+    parser.add_argument("--alloc-requests", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scenario", action="append", help="run only these scenarios")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--save", action="store_true", help="write the results as the baseline")
+    parser.add_argument("--output", type=Path, help="also write the results to this file")
+    parser.add_argument("--schema", default="bench_api")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--flush", action="store_true",
+        help="allow flushing the Redis database at REDIS_URL, which must be a scratch one"
+    )
+    args = parser.parse_args()
+    if not args.flush:
+        parser.error(
+            "the benchmark runs FLUSHDB on the Redis database at REDIS_URL; point it at a "
+            "scratch database and pass --flush"
+        )
+    return args
+
+
+class Account:
+    __slots__ = ("user_id", "username", "headers")
+
+    def __init__(self, user_id: int, username: str):
+        self.user_id = user_id
+        self.username = username
+        token = create_access_token({"sub": username, "uid": user_id})
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+
+async def seed(count: int) -> list[Account]:
+    password_hash = pwd_context.hash(PASSWORD)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            insert(User).returning(User.id, User.username),
+            [
+                {"username": f"bench_{n}", "password_hash": password_hash, "coins": 10_000_000}
+                for n in range(count)
+            ]
+        )
+        accounts = [Account(row.id, row.username) for row in result]
+        await session.commit()
+    return accounts
+
+
+def lift_rate_limits():
+    # The limiter stays in the stack, so its Redis round trip is still measured.
+    for middleware in app.user_middleware:
+        dispatch = middleware.kwargs.get("dispatch")
+        if isinstance(dispatch, RateLimiter):
+            dispatch.rate_limits = {path: 10**9 for path in dispatch.rate_limits}
+
+
+Call = Callable[[AsyncClient], Awaitable[Response]]
+
+
+def scenarios(accounts: list[Account], rng: random.Random) -> dict[str, Call]:
+    regulars = accounts[:REGULARS]
+    fresh = iter(accounts[REGULARS:])
+    cycle = itertools.cycle(accounts)
+
+    async def auth(client: AsyncClient) -> Response:
+        account = next(cycle)
+        return await client.post(
+            "/api/auth", json={"username": account.username, "password": PASSWORD}
+        )
+
+    async def info_miss(client: AsyncClient) -> Response:
+        # Every account is asked for once, so /api/info is never cached yet.
+        return await client.get("/api/info", headers=next(fresh).headers)
+
+    async def info_hit(client: AsyncClient) -> Response:
+        return await client.get("/api/info", headers=rng.choice(regulars).headers)
+
+    async def buy(client: AsyncClient) -> Response:
+        return await client.get("/api/buy/pen", headers=rng.choice(regulars).headers)
+
+    async def send_coin(client: AsyncClient) -> Response:
+        sender, recipient = rng.sample(regulars, 2)
+        return await client.post(
+            "/api/sendCoin",
+            json={"toUser": recipient.username, "amount": 1},
+            headers=sender.headers
+        )
+
+    return {
+        "auth": auth,
+        "info_miss": info_miss,
+        "info_hit": info_hit,
+        "buy": buy,
+        "send_coin": send_coin,
+    }
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def request(client: AsyncClient, name: str, call: Call) -> Response:
+    response = await call(client)
+    if response.status_code >= 400:
+        raise RuntimeError(f"{name}: {response.status_code} {response.text}")
+    return response
+
+
+async def measure(
+    client: AsyncClient,
+    name: str,
+    call: Call,
+    requests: int,
+    args: argparse.Namespace
+) -> dict:
+    for _ in range(min(args.warmup, requests)):
+        await request(client, name, call)
+
+    latencies, statements, round_trips = [], [], []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await request(client, name, call)
+            latencies.append(time.perf_counter() - started)
+            statements.append(int(response.headers["X-DB-Queries"]))
+            round_trips.append(int(response.headers["X-DB-Round-Trips"]))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    # Sequential and separate from the timed run: tracing slows every request.
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(min(args.alloc_requests, requests)):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await request(client, name, call)
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "requests": requests,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "alloc_kib": round(statistics.median(peaks) / 1024, 1),
+        "statements": max(statements),
+        "round_trips": max(round_trips),
+    }
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, higher_is_better in TIMED_METRICS.items():
+            if metric not in previous:
+                continue
+            limit = previous[metric] * (1 - tolerance if higher_is_better else 1 + tolerance)
+            if current[metric] < limit if higher_is_better else current[metric] > limit:
+                found.append(
+                    f"{name}.{metric}: {current[metric]} vs baseline {previous[metric]}"
+                )
+        for metric in COUNT_METRICS:
+            if metric in previous and current[metric] > previous[metric]:
+                found.append(
+                    f"{name}.{metric}: {current[metric]} vs baseline {previous[metric]}"
+                )
+    return found
+
+
+def report(results: dict):
+    print(
+        f"{'scenario':<10} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'alloc KiB':>10} {'stmts':>6} {'trips':>6}"
+    )
+    for name, r in results.items():
+        print(
+            f"{name:<10} {r['throughput_rps']:>9.1f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+            f"{r['alloc_kib']:>10.1f} {r['statements']:>6} {r['round_trips']:>6}"
+        )
+
+
+async def run(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {args.schema}"))
+    # Rebinding the app's own session factories keeps its pool, statement
+    # cache, get_db and get_read_db unchanged; only the schema differs.
+    schema_engine = engine.execution_options(schema_translate_map={None: args.schema})
+    AsyncSessionLocal.configure(bind=schema_engine)
+    replica_router.primary = schema_engine
+    await redis_cache.init()
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.run_sync(lambda s: Base.metadata.create_all(s.connection()))
+            await session.commit()
+        await redis_cache.command("FLUSHDB")
+        lift_rate_limits()
+
+        accounts = await seed(REGULARS + args.requests + args.warmup + args.alloc_requests)
+        calls = scenarios(accounts, rng)
+        results = {}
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            # Warm the identity and /api/info caches of the regulars, so every
+            # scenario starts from the same state when run on its own.
+            for account in accounts[:REGULARS]:
+                await request(client, "warmup", lambda c, a=account: c.get(
+                    "/api/info", headers=a.headers
+                ))
+            for name, call in calls.items():
+                if args.scenario and name not in args.scenario:
+                    continue
+                requests = args.auth_requests if name == "auth" else args.requests
+                results[name] = await measure(client, name, call, requests, args)
+        return results
+    finally:
+        await redis_cache.close()
+        password_hasher.shutdown()
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE"))
+        await engine.dispose()
+
+
+def main():
+    args = parse_args()
+    results = asyncio.run(run(args))
+    report(results)
+
+    document = {
+        "settings": {
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "cache_serializer": settings.CACHE_SERIALIZER,
+        },
+        "scenarios": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(document, indent=2) + "\n")
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(document, indent=2) + "\n")
+        print(f"baseline saved to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}, run with --save to record one")
+        return
+
+    baseline = json.loads(args.baseline.read_text())["scenarios"]
+    found = regressions(results, baseline, args.tolerance)
+    if found:
+        print(f"regressions beyond {args.tolerance:.0%}:")
+        for line in found:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"no regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
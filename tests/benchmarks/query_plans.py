@@ -0,0 +1,161 @@
+"""Query plans and latency of the hot-path statements on a large dataset.
+
+Seeds an isolated schema with generate_series and runs the statements used by
+/api/info, /api/buy and /api/sendCoin against it:
+
+    python -m tests.benchmarks.query_plans --transactions 1000000
+    python -m tests.benchmarks.query_plans --without-indexes
+
+The schema is dropped afterwards unless --keep is given.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from sqlalchemy import Index, func, or_, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.api.history import history_statement
+from app.api.info import info_statement
+from app.api.shop import purchase_statement
+from app.core.config import settings
+from app.db.base import Base
+from app.models.models import Transaction, User
+
+
+HOT_PATH_INDEXES = ["ix_transactions_to_user_created", "ix_transactions_from_user_created"]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--schema", default="bench")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--without-indexes", action="store_true")
+    parser.add_argument("--keep", action="store_true")
+    return parser.parse_args()
+
+
+async def seed(conn, args: argparse.Namespace):
+    await conn.run_sync(Base.metadata.create_all)
+    if args.without_indexes:
+        for name in HOT_PATH_INDEXES:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+    await conn.execute(text(
+        "INSERT INTO users (username, password_hash, coins) "
+        "SELECT 'bench_user_' || n, 'x', 1000000 FROM generate_series(1, :users) AS n"
+    ), {"users": args.users})
+    await conn.execute(text(
+        "INSERT INTO transactions (from_user_id, to_user_id, amount, created_at) "
+        "SELECT 1 + (n::bigint * 7919) % :users, 1 + (n::bigint * 104729 + 1) % :users, 1 + n % 50, "
+        "now() - n * interval '1 second' "
+        "FROM generate_series(1, :transactions) AS n"
+    ), {"users": args.users, "transactions": args.transactions})
+    await conn.execute(text(
+        "INSERT INTO inventory (user_id, item_name, quantity) "
+        "SELECT u, item, 1 + u % 5 FROM generate_series(1, :users) AS u, "
+        "unnest(ARRAY['pen', 'cup', 'book']) AS item"
+    ), {"users": args.users})
+    await conn.execute(text("ANALYZE"))
+
+
+async def explain(conn, statement) -> str:
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    result = await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {compiled}"))
+    return "\n".join(row[0] for row in result)
+
+
+async def measure(engine, name: str, make_statement, runs: int):
+    timings = []
+    async with engine.connect() as conn:
+        print(f"\n=== {name}\n{await explain(conn, make_statement())}")
+        await conn.rollback()
+        for _ in range(runs):
+            started = time.perf_counter()
+            await conn.execute(make_statement())
+            timings.append((time.perf_counter() - started) * 1000)
+            await conn.rollback()
+
+    timings.sort()
+    p99 = timings[min(int(len(timings) * 0.99), len(timings) - 1)]
+    print(f"--- {name}: p50={statistics.median(timings):.2f}ms p99={p99:.2f}ms runs={runs}")
+
+
+async def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    admin = create_async_engine(settings.POSTGRES_URL)
+    async with admin.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {args.schema}"))
+
+    engine = create_async_engine(
+        settings.POSTGRES_URL,
+        connect_args={"server_settings": {"search_path": args.schema}}
+    )
+    try:
+        started = time.perf_counter()
+        async with engine.begin() as conn:
+            await seed(conn, args)
+        print(
+            f"seeded {args.users} users and {args.transactions} transactions "
+            f"in {time.perf_counter() - started:.1f}s "
+            f"({'without' if args.without_indexes else 'with'} hot path indexes)"
+        )
+
+        def user_id() -> int:
+            return rng.randint(1, args.users)
+
+        def transfer_lock():
+            return (
+                select(User.id, User.username, User.coins)
+                .where(or_(User.id == user_id(), User.username == f"bench_user_{user_id()}"))
+                .order_by(User.id)
+                .with_for_update()
+            )
+
+        async with engine.connect() as conn:
+            # A cursor at the oldest entry of the busiest recipient, the last
+            # page of the longest history: with the keyset index it costs the
+            # same as the first one.
+            busiest = (
+                select(Transaction.to_user_id)
+                .group_by(Transaction.to_user_id)
+                .order_by(func.count().desc())
+                .limit(1)
+                .scalar_subquery()
+            )
+            deep = (await conn.execute(
+                select(Transaction.to_user_id, Transaction.created_at, Transaction.id)
+                .where(Transaction.to_user_id == busiest)
+                .order_by(Transaction.created_at, Transaction.id)
+                .limit(1)
+            )).one()
+
+        await measure(engine, "info", lambda: info_statement(user_id()), args.runs)
+        await measure(engine, "buy", lambda: purchase_statement(user_id(), "pen", 10), args.runs)
+        await measure(engine, "sendCoin lock", transfer_lock, args.runs)
+        await measure(
+            engine, "received history page",
+            lambda: history_statement(user_id(), "received", 51), args.runs
+        )
+        await measure(
+            engine, "received history deep page",
+            lambda: history_statement(
+                deep.to_user_id, "received", 51, (deep.created_at, deep.id + 1)
+            ), args.runs
+        )
+    finally:
+        await engine.dispose()
+        if not args.keep:
+            async with admin.begin() as conn:
+                await conn.execute(text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE"))
+        await admin.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,14 +1,23 @@
 import asyncio
+import os
+import pytest
 import pytest_asyncio
-from typing import AsyncGenerator, Dict
+from typing import AsyncGenerator, Dict, Optional
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
+from redis.asyncio import from_url
+
+# Read by app.main when the app is built: every response reports how many
+# statements and round trips it cost, which max_queries checks.
+os.environ.setdefault("DB_QUERY_HEADERS", "true")
 
 from app.core.config import settings
 from app.db.base import Base
+from app.db.cache import redis_cache
 from app.main import app
+from app.db.replicas import replica_router
 from app.db.session import get_db
 from app.core.security import create_access_token
 from app.models.models import User
@@ -31,6 +40,8 @@ async def override_get_db() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 app.dependency_overrides[get_db] = override_get_db
+# Read-only routes fall back to the primary: no replicas are configured here.
+replica_router.primary = engine
 
 @pytest_asyncio.fixture(scope="session")
 def event_loop():
@@ -46,6 +57,11 @@ async def setup_database():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+    redis = from_url(str(settings.REDIS_URL))
+    await redis.flushdb()
+    await redis.aclose()
+    if redis_cache.near is not None:
+        redis_cache.near.clear()
     yield
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
@@ -86,3 +102,19 @@ async def test_user(db_session: AsyncSession) -> Dict[str, str]:
 async def authorized_client(client: AsyncClient, test_user: Dict[str, str]) -> AsyncClient:
     client.headers["Authorization"] = f"Bearer {test_user['token']}"
     return client
+
+@pytest.fixture
+def max_queries():
+    def check(response, statements: int, round_trips: Optional[int] = None):
+        count = int(response.headers["X-DB-Queries"])
+        assert count <= statements, (
+            f"{response.request.method} {response.request.url.path} ran {count} "
+            f"SQL statements, budget is {statements}"
+        )
+        if round_trips is not None:
+            trips = int(response.headers["X-DB-Round-Trips"])
+            assert trips <= round_trips, (
+                f"{response.request.method} {response.request.url.path} made {trips} "
+                f"database round trips, budget is {round_trips}"
+            )
+    return check
@@ -0,0 +1,90 @@
+"""Pre-provisions the accounts used by tests/locustfile.py.
+
+Creates (or resets the balance of) --accounts users named <prefix><rank> and
+writes their tokens to a JSON file, so a load test starts without a storm of
+/api/auth calls and never sends coins to users that do not exist:
+
+    python -m tests.load.provision --accounts 10000 --out load_accounts.json
+
+Tokens expire after ACCESS_TOKEN_EXPIRE_MINUTES; provision again after that.
+"""
+import argparse
+import asyncio
+import json
+from pathlib import Path
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.core.config import settings
+from app.core.hashing import pwd_context
+from app.core.security import create_access_token
+from app.db.cache import redis_cache
+from app.db.info_cache import info_cache
+from app.models.models import User
+from tests.load.scenarios import account_name
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=10_000)
+    parser.add_argument("--coins", type=int, default=1_000_000)
+    parser.add_argument("--prefix", default="load_user_")
+    parser.add_argument("--password", default="loadtest")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--out", type=Path, default=Path("load_accounts.json"))
+    return parser.parse_args()
+
+
+async def provision(args: argparse.Namespace) -> list[dict]:
+    password_hash = pwd_context.hash(args.password)
+    engine = create_async_engine(settings.POSTGRES_URL)
+    accounts = {}
+    try:
+        for start in range(0, args.accounts, args.batch_size):
+            rows = [
+                {"username": account_name(args.prefix, rank), "password_hash": password_hash,
+                 "coins": args.coins}
+                for rank in range(start, min(start + args.batch_size, args.accounts))
+            ]
+            statement = insert(User).values(rows)
+            statement = statement.on_conflict_do_update(
+                index_elements=[User.username],
+                set_={
+                    "password_hash": statement.excluded.password_hash,
+                    "coins": statement.excluded.coins,
+                    "version": User.version + 1,
+                }
+            ).returning(User.id, User.username)
+            async with engine.begin() as conn:
+                result = await conn.execute(statement)
+                ids = {row.username: row.id for row in result}
+            accounts.update(ids)
+            # Balances were reset behind the cache's back.
+            await info_cache.invalidate(*ids.values())
+    finally:
+        await engine.dispose()
+        await redis_cache.close()
+
+    return [
+        {
+            "username": username,
+            "token": create_access_token({"sub": username, "uid": user_id}),
+        }
+        for username, user_id in sorted(
+            accounts.items(), key=lambda item: int(item[0][len(args.prefix):])
+        )
+    ]
+
+
+def main():
+    args = parse_args()
+    accounts = asyncio.run(provision(args))
+    args.out.write_text(json.dumps({
+        "prefix": args.prefix,
+        "password": args.password,
+        "accounts": accounts,
+    }))
+    print(f"provisioned {len(accounts)} accounts, tokens written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Replays traffic recorded by CAPTURE_ENABLED against a running instance.
+
+Requests are re-issued in their original order with their original
+inter-arrival times, divided by --speed. Captured users are replaced by
+accounts from `python -m tests.load.provision`: every principal hash is mapped
+to one provisioned account in order of first appearance, and hashed user
+names in bodies (recipients, logins) follow the same mapping.
+
+    python -m tests.load.replay capture/traffic-*.jsonl* --host http://localhost:8080
+    python -m tests.load.replay capture/traffic-*.jsonl* --speed 4 --report replay.json
+
+Reports the captured and replayed p50/p99 latency of every route and their
+difference, how many responses got a different status than when captured, and
+how far the scheduler fell behind the captured timeline.
+
+Headers are not captured, so conditional /api/info requests are replayed as
+plain GETs and show up as 304 -> 200 status mismatches.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Optional
+from httpx import AsyncClient, HTTPError
+from app.middleware.capture import REDACTED
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("captures", type=Path, nargs="+")
+    parser.add_argument("--host", default="http://localhost:8080")
+    parser.add_argument("--accounts-file", type=Path, default=Path("load_accounts.json"))
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--max-in-flight", type=int, default=500)
+    parser.add_argument("--skip-route", action="append", default=["/metrics"])
+    parser.add_argument("--report", type=Path, help="write a JSON report to this file")
+    return parser.parse_args()
+
+
+def load_records(paths: list[Path], skip: set[str], limit: Optional[int]) -> list[dict]:
+    # Rotated files and the logs of several workers interleave: merge by time.
+    records = []
+    for path in paths:
+        with path.open(encoding="utf-8") as lines:
+            records.extend(json.loads(line) for line in lines if line.strip())
+    records = [record for record in records if record["route"] not in skip]
+    records.sort(key=lambda record: record["ts"])
+    return records[:limit] if limit else records
+
+
+class AccountMap:
+    def __init__(self, accounts: list[dict], password: str):
+        self.accounts = accounts
+        self.password = password
+        self._assigned: dict[str, dict] = {}
+
+    def __getitem__(self, hashed: str) -> dict:
+        account = self._assigned.get(hashed)
+        if account is None:
+            # More captured users than provisioned accounts: they share.
+            account = self.accounts[len(self._assigned) % len(self.accounts)]
+            self._assigned[hashed] = account
+        return account
+
+    def __len__(self) -> int:
+        return len(self._assigned)
+
+    def body(self, shape: Any) -> Any:
+        if isinstance(shape, dict):
+            return {key: self.body(value) for key, value in shape.items()}
+        if isinstance(shape, list):
+            return [self.body(value) for value in shape]
+        if shape == REDACTED:
+            return self.password
+        if isinstance(shape, str) and shape.startswith("#"):
+            return self[shape]["username"]
+        return shape
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Replay:
+    def __init__(self, client: AsyncClient, accounts: AccountMap, max_in_flight: int):
+        self.client = client
+        self.accounts = accounts
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.results: list[tuple[dict, float, int]] = []
+        self.lag: list[float] = []
+
+    async def issue(self, record: dict):
+        headers = {}
+        if record["principal"]:
+            headers["Authorization"] = f"Bearer {self.accounts[record['principal']]['token']}"
+        body = record["body"]
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(
+                record["method"],
+                record["path"] + (f"?{record['query']}" if record["query"] else ""),
+                headers=headers,
+                json=self.accounts.body(body) if body is not None else None
+            )
+            status = response.status_code
+        except HTTPError:
+            status = 0
+        finally:
+            self.slots.release()
+        self.results.append((record, (time.perf_counter() - started) * 1000, status))
+
+    async def run(self, records: list[dict], speed: float):
+        tasks = set()
+        origin = records[0]["ts"]
+        started = time.perf_counter()
+        for record in records:
+            delay = (record["ts"] - origin) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.slots.acquire()
+            self.lag.append(max(
+                (time.perf_counter() - started) - (record["ts"] - origin) / speed, 0.0
+            ) * 1000)
+            task = asyncio.create_task(self.issue(record))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+
+
+def build_report(replay: Replay, speed: float) -> dict[str, Any]:
+    by_route = defaultdict(list)
+    for record, elapsed, status in replay.results:
+        by_route[f"{record['method']} {record['route']}"].append((record, elapsed, status))
+
+    routes = {}
+    for route, results in sorted(by_route.items()):
+        captured = [record["ms"] for record, _, _ in results]
+        replayed = [elapsed for _, elapsed, _ in results]
+        summary = {"requests": len(results)}
+        for name, fraction in (("p50", 0.5), ("p99", 0.99)):
+            before, after = percentile(captured, fraction), percentile(replayed, fraction)
+            summary[f"captured_{name}_ms"] = round(before, 3)
+            summary[f"replay_{name}_ms"] = round(after, 3)
+            summary[f"delta_{name}_ms"] = round(after - before, 3)
+        summary["status_mismatches"] = sum(
+            record["status"] != status for record, _, status in results
+        )
+        routes[route] = summary
+
+    return {
+        "speed": speed,
+        "requests": len(replay.results),
+        "principals": len(replay.accounts),
+        "scheduler_lag_p99_ms": round(percentile(replay.lag, 0.99), 3) if replay.lag else 0.0,
+        "scheduler_lag_max_ms": round(max(replay.lag, default=0.0), 3),
+        "routes": routes,
+    }
+
+
+def print_report(report: dict[str, Any]):
+    print(
+        f"{'route':<32} {'reqs':>6} {'p50 before':>10} {'p50 after':>10} {'delta':>8} "
+        f"{'p99 before':>10} {'p99 after':>10} {'delta':>8} {'status!=':>8}"
+    )
+    for route, r in report["routes"].items():
+        print(
+            f"{route:<32} {r['requests']:>6} {r['captured_p50_ms']:>10.2f} "
+            f"{r['replay_p50_ms']:>10.2f} {r['delta_p50_ms']:>+8.2f} {r['captured_p99_ms']:>10.2f} "
+            f"{r['replay_p99_ms']:>10.2f} {r['delta_p99_ms']:>+8.2f} {r['status_mismatches']:>8}"
+        )
+    print(
+        f"{report['requests']} requests from {report['principals']} users at "
+        f"{report['speed']}x, scheduler lag p99 {report['scheduler_lag_p99_ms']:.1f}ms "
+        f"max {report['scheduler_lag_max_ms']:.1f}ms"
+    )
+
+
+async def main():
+    args = parse_args()
+    records = load_records(args.captures, set(args.skip_route), args.limit)
+    if not records:
+        print("nothing to replay")
+        return
+    provisioned = json.loads(args.accounts_file.read_text())
+    accounts = AccountMap(provisioned["accounts"], provisioned["password"])
+
+    async with AsyncClient(base_url=args.host, timeout=30) as client:
+        replay = Replay(client, accounts, args.max_in_flight)
+        await replay.run(records, args.speed)
+
+    report = build_report(replay, args.speed)
+    print_report(report)
+    if args.report:
+        args.report.write_text(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""Machine-readable summary of a locust run and its SLO check."""
+from typing import Any
+from tests.load.scenarios import Profile
+
+RATE_LIMITED = "rate limited"
+
+
+def rate_limited(stats, name: str, method: str) -> int:
+    return sum(
+        error.occurrences for error in stats.errors.values()
+        if error.name == name and error.method == method and RATE_LIMITED in str(error.error)
+    )
+
+
+def route_summary(entry, limited: int) -> dict[str, Any]:
+    # 429s are failures in locust's stats but reported on their own: they
+    # measure the rate limiter configuration, not the service.
+    errors = entry.num_failures - limited
+    return {
+        "method": entry.method,
+        "requests": entry.num_requests,
+        "errors": errors,
+        "rate_limited": limited,
+        "error_rate": errors / entry.num_requests if entry.num_requests else 0.0,
+        "rps": entry.total_rps,
+        "avg_ms": entry.avg_response_time,
+        "p50_ms": entry.get_response_time_percentile(0.5),
+        "p95_ms": entry.get_response_time_percentile(0.95),
+        "p99_ms": entry.get_response_time_percentile(0.99),
+    }
+
+
+def build_report(stats, scenario: str, profile: Profile, seed: int) -> dict[str, Any]:
+    routes = {}
+    for entry in stats.entries.values():
+        routes[entry.name] = route_summary(
+            entry, rate_limited(stats, entry.name, entry.method)
+        )
+    requests = sum(route["requests"] for route in routes.values())
+    errors = sum(route["errors"] for route in routes.values())
+
+    violations = []
+    for route, limit in profile.slo_p99_ms.items():
+        summary = routes.get(route)
+        if summary is not None and summary["p99_ms"] > limit:
+            violations.append(f"{route}: p99 {summary['p99_ms']:.0f}ms > {limit:.0f}ms")
+    error_rate = errors / requests if requests else 0.0
+    if error_rate > profile.max_error_rate:
+        violations.append(f"error rate {error_rate:.2%} > {profile.max_error_rate:.2%}")
+
+    return {
+        "scenario": scenario,
+        "seed": seed,
+        "profile": {
+            "mix": profile.mix,
+            "user_skew": profile.user_skew,
+            "recipient_skew": profile.recipient_skew,
+            "item_skew": profile.item_skew,
+            "think": profile.think._asdict(),
+        },
+        "duration_s": stats.last_request_timestamp - stats.start_time
+        if stats.last_request_timestamp else 0.0,
+        "requests": requests,
+        "errors": errors,
+        "error_rate": error_rate,
+        "routes": routes,
+        "slo": {
+            "p99_ms": profile.slo_p99_ms,
+            "max_error_rate": profile.max_error_rate,
+            "violations": violations,
+            "passed": not violations,
+        },
+    }
@@ -0,0 +1,119 @@
+"""Seeded load profiles for tests/locustfile.py.
+
+A profile fixes how popular each account and item is (Zipf exponents), the
+read/write mix, the think time between requests and the SLOs a headless run
+is checked against. Accounts are ranked: rank 0 is the hottest one, both as
+the caller and as a recipient.
+"""
+import bisect
+import itertools
+import random
+from typing import NamedTuple
+from app.core.config import MERCH_PRICES
+
+
+class Zipf:
+    # P(rank k) is proportional to 1 / (k + 1) ** exponent; 0 is uniform.
+    def __init__(self, size: int, exponent: float):
+        self.cumulative = list(itertools.accumulate(
+            1 / (rank + 1) ** exponent for rank in range(size)
+        ))
+
+    def sample(self, rng: random.Random) -> int:
+        return bisect.bisect(self.cumulative, rng.random() * self.cumulative[-1])
+
+
+class ThinkTime(NamedTuple):
+    distribution: str = "exponential"
+    mean: float = 0.5
+
+    @classmethod
+    def parse(cls, value: str) -> "ThinkTime":
+        distribution, _, mean = value.partition(":")
+        return cls(distribution, float(mean or 0))
+
+    def sample(self, rng: random.Random) -> float:
+        if self.distribution == "none":
+            return 0.0
+        if self.distribution == "constant":
+            return self.mean
+        if self.distribution == "uniform":
+            return rng.uniform(0, 2 * self.mean)
+        if self.distribution == "exponential":
+            # Exponential gaps make arrivals a Poisson process.
+            return rng.expovariate(1 / self.mean) if self.mean else 0.0
+        raise ValueError(f"Unknown think time distribution: {self.distribution}")
+
+
+class Profile(NamedTuple):
+    # Task weights: info, info_revalidate, history, buy, send, auth.
+    mix: dict[str, int]
+    user_skew: float = 1.0
+    recipient_skew: float = 1.0
+    item_skew: float = 1.0
+    think: ThinkTime = ThinkTime()
+    slo_p99_ms: dict[str, float] = {}
+    max_error_rate: float = 0.01
+
+
+DEFAULT_SLO_P99_MS = {
+    "/api/info": 50,
+    "/api/history/received": 100,
+    "/api/buy/{item}": 100,
+    "/api/sendCoin": 150,
+    "/api/auth": 1000,
+}
+
+PROFILES = {
+    # Everyday traffic: mostly reads of a moderately skewed user base.
+    "steady": Profile(
+        mix={"info": 50, "info_revalidate": 20, "history": 5, "buy": 15, "send": 9, "auth": 1},
+        slo_p99_ms=DEFAULT_SLO_P99_MS,
+    ),
+    # A few accounts get most of the traffic, on both sides of a transfer:
+    # row lock contention on sendCoin and cache churn on /api/info.
+    "hot_accounts": Profile(
+        mix={"info": 40, "info_revalidate": 10, "buy": 20, "send": 30},
+        user_skew=1.3,
+        recipient_skew=1.5,
+        think=ThinkTime("exponential", 0.2),
+        slo_p99_ms=DEFAULT_SLO_P99_MS,
+    ),
+    # One item sells out: purchases of a hot item by many accounts.
+    "flash_sale": Profile(
+        mix={"info": 30, "buy": 70},
+        user_skew=0.5,
+        item_skew=2.5,
+        think=ThinkTime("uniform", 0.1),
+        slo_p99_ms=DEFAULT_SLO_P99_MS,
+    ),
+    # Clients polling /api/info with If-None-Match: the 304 fast path.
+    "cache_hits": Profile(
+        mix={"info": 10, "info_revalidate": 88, "buy": 1, "send": 1},
+        user_skew=1.1,
+        think=ThinkTime("constant", 0.5),
+        slo_p99_ms={"/api/info": 20, "/api/buy/{item}": 100, "/api/sendCoin": 150},
+    ),
+}
+
+# Ranked from the cheapest item, so a hot item is one everybody can afford.
+ITEMS = sorted(MERCH_PRICES, key=MERCH_PRICES.get)
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for part in filter(None, value.split(",")):
+        task, _, weight = part.partition("=")
+        mix[task.strip()] = int(weight)
+    return mix
+
+
+def parse_slo(value: str) -> dict[str, float]:
+    return {
+        route.strip(): float(limit)
+        for route, _, limit in (part.partition("=") for part in filter(None, value.split(",")))
+    }
+
+
+def account_name(prefix: str, rank: int) -> str:
+    return f"{prefix}{rank}"
@@ -1,82 +1,178 @@
-from locust import HttpUser, task, between
-from random import randint, choice
+"""Seeded load scenarios for the shop API.
+
+Accounts are created beforehand with `python -m tests.load.provision`;
+popularity, read/write mix, think time and SLOs come from the scenario in
+tests/load/scenarios.py and can be overridden from the command line:
+
+    locust -f tests/locustfile.py --host=http://localhost:8080 --scenario hot_accounts
+    locust -f tests/locustfile.py --host=http://localhost:8080 --headless -u 200 -r 50 -t 2m \
+        --scenario steady --seed 7 --report load_report.json
+
+A headless run checks the SLOs when it stops and exits with status 1 if one
+is missed.
+"""
+import itertools
+import json
 import logging
-import time
+import random
+from pathlib import Path
+from locust import HttpUser, events, task
+from locust.runners import MasterRunner, WorkerRunner
+from tests.load.report import RATE_LIMITED, build_report
+from tests.load.scenarios import ITEMS, PROFILES, ThinkTime, Zipf, parse_mix, parse_slo
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class Load:
+    scenario = None
+    profile = None
+    seed = 0
+    password = None
+    accounts = []
+    users = None
+    recipients = None
+    items = None
+    tasks = []
+    weights = []
+
+
+user_numbers = itertools.count()
+
+
+@events.init_command_line_parser.add_listener
+def add_arguments(parser):
+    parser.add_argument("--scenario", choices=sorted(PROFILES), default="steady")
+    parser.add_argument("--accounts-file", default="load_accounts.json")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mix", default="", help="task weights, e.g. info=80,buy=15,send=5")
+    parser.add_argument("--think", default="", help="think time, e.g. exponential:0.5")
+    parser.add_argument("--slo-p99", default="", help="p99 SLOs in ms, e.g. /api/info=50")
+    parser.add_argument("--max-error-rate", type=float, default=None)
+    parser.add_argument("--report", default="", help="write a JSON report to this file")
+
+
+@events.test_start.add_listener
+def configure(environment, **kwargs):
+    options = environment.parsed_options
+    profile = PROFILES[options.scenario]
+    overrides = {}
+    if options.mix:
+        overrides["mix"] = parse_mix(options.mix)
+    if options.think:
+        overrides["think"] = ThinkTime.parse(options.think)
+    if options.slo_p99:
+        overrides["slo_p99_ms"] = {**profile.slo_p99_ms, **parse_slo(options.slo_p99)}
+    if options.max_error_rate is not None:
+        overrides["max_error_rate"] = options.max_error_rate
+    profile = profile._replace(**overrides)
+
+    # The master of a distributed run only aggregates stats.
+    if not isinstance(environment.runner, MasterRunner):
+        provisioned = json.loads(Path(options.accounts_file).read_text())
+        Load.accounts = provisioned["accounts"]
+        Load.password = provisioned["password"]
+        Load.users = Zipf(len(Load.accounts), profile.user_skew)
+        Load.recipients = Zipf(len(Load.accounts), profile.recipient_skew)
+        Load.items = Zipf(len(ITEMS), profile.item_skew)
+
+    Load.scenario = options.scenario
+    Load.profile = profile
+    Load.seed = options.seed
+    Load.tasks = list(profile.mix)
+    Load.weights = list(profile.mix.values())
+
+
+@events.quitting.add_listener
+def check_slo(environment, **kwargs):
+    if isinstance(environment.runner, WorkerRunner) or Load.profile is None:
+        return
+    report = build_report(environment.stats, Load.scenario, Load.profile, Load.seed)
+    options = environment.parsed_options
+    if options.report:
+        Path(options.report).write_text(json.dumps(report, indent=2) + "\n")
+    if not options.headless:
+        return
+    for violation in report["slo"]["violations"]:
+        logger.error("SLO missed: %s", violation)
+    # Set either way: left unset, locust exits 1 on any failure, and 429s or
+    # errors within max_error_rate are failures to it.
+    environment.process_exit_code = 0 if report["slo"]["passed"] else 1
+
+
 class MerchantShopUser(HttpUser):
-    wait_time = between(0.01, 0.1)
-    token = None
-    username = None
-    
     def on_start(self):
-        try:
-            self.username = f"loadtest_user_{randint(1, 100000)}"
-            
-            with self.client.post(
-                "/api/auth",
-                json={
-                    "username": self.username,
-                    "password": "testpass123"
-                },
-                catch_response=True
-            ) as response:
-                if response.status_code == 200:
-                    self.token = response.json()["token"]
-                    self.client.headers = {"Authorization": f"Bearer {self.token}"}
-                    response.success()
-                elif response.status_code == 429:
-                    time.sleep(1)
-                    self.on_start()
-                else:
-                    response.failure(f"Auth failed: {response.status_code}")
-        except Exception as e:
-            logger.error(f"Auth error: {str(e)}")
-            time.sleep(1)
-            self.on_start()
-    
-    @task(5)
-    def check_info(self):
-        with self.client.get("/api/info", catch_response=True) as response:
-            if response.status_code == 429:
-                response.success()
-            elif response.status_code != 200:
-                response.failure(f"Info failed: {response.status_code}")
-    
-    @task(2)
-    def buy_item(self):
-        items = ["t-shirt", "cup", "book", "pen", "powerbank", 
-                "hoody", "umbrella", "socks", "wallet", "pink-hoody"]
-        item = choice(items)
-        
-        with self.client.get(f"/api/buy/{item}", catch_response=True) as response:
+        # One generator per simulated user, derived from the run seed, so the
+        # same seed replays the same sequence of requests per user.
+        self.rng = random.Random(f"{Load.seed}:{next(user_numbers)}")
+        self.etags = {}
+
+    def wait_time(self) -> float:
+        return Load.profile.think.sample(self.rng)
+
+    def account(self, ranks: Zipf) -> dict:
+        return Load.accounts[ranks.sample(self.rng)]
+
+    def request(self, method: str, path: str, name: str, account: dict, ok=(200,), **kwargs):
+        headers = {"Authorization": f"Bearer {account['token']}", **kwargs.pop("headers", {})}
+        with self.client.request(
+            method, path, name=name, headers=headers, catch_response=True, **kwargs
+        ) as response:
             if response.status_code == 429:
-                response.success()
-            elif response.status_code != 200:
-                response.failure(f"Purchase failed: {response.status_code}")
-    
-    @task(1)
-    def send_coins(self):
-        if not hasattr(self, 'last_send_time'):
-            self.last_send_time = 0
-        
-        current_time = time.time()
-        if current_time - self.last_send_time < 1:
-            return
-        
-        amount = randint(1, 50)
-        recipient = f"loadtest_user_{randint(1, 100000)}"
-        
+                response.failure(RATE_LIMITED)
+            elif response.status_code not in ok:
+                response.failure(f"{response.status_code}: {response.text[:200]}")
+            return response
+
+    @task
+    def next_request(self):
+        name = self.rng.choices(Load.tasks, Load.weights)[0]
+        getattr(self, name)()
+
+    def info(self):
+        account = self.account(Load.users)
+        response = self.request("GET", "/api/info", "/api/info", account)
+        if response.status_code == 200:
+            self.etags[account["username"]] = response.headers.get("ETag")
+
+    def info_revalidate(self):
+        account = self.account(Load.users)
+        etag = self.etags.get(account["username"])
+        response = self.request(
+            "GET", "/api/info", "/api/info", account, ok=(200, 304),
+            headers={"If-None-Match": etag} if etag else {}
+        )
+        if response.status_code == 200:
+            self.etags[account["username"]] = response.headers.get("ETag")
+
+    def history(self):
+        self.request(
+            "GET", "/api/history/received", "/api/history/received",
+            self.account(Load.users), params={"limit": 20}
+        )
+
+    def buy(self):
+        item = ITEMS[Load.items.sample(self.rng)]
+        self.request("GET", f"/api/buy/{item}", "/api/buy/{item}", self.account(Load.users))
+
+    def send(self):
+        sender = self.account(Load.users)
+        recipient = self.account(Load.recipients)
+        while recipient is sender:
+            recipient = self.account(Load.recipients)
+        self.request(
+            "POST", "/api/sendCoin", "/api/sendCoin", sender,
+            json={"toUser": recipient["username"], "amount": self.rng.randint(1, 50)}
+        )
+
+    def auth(self):
+        account = self.account(Load.users)
         with self.client.post(
-            "/api/sendCoin",
-            json={"toUser": recipient, "amount": amount},
+            "/api/auth",
+            json={"username": account["username"], "password": Load.password},
             catch_response=True
         ) as response:
             if response.status_code == 429:
-                response.success()
+                response.failure(RATE_LIMITED)
             elif response.status_code != 200:
-                response.failure(f"Send coins failed: {response.status_code}")
-            
-            self.last_send_time = current_time
+                response.failure(f"{response.status_code}: {response.text[:200]}")
@@ -45,4 +45,78 @@ async def test_login_invalid_username(client: AsyncClient):
     
     assert response.status_code == 200
     assert "token" in response.json()
-    
\ No newline at end of file
+    
+async def test_auth_rejected_when_hash_queue_full(client: AsyncClient, monkeypatch):
+    from app.core.hashing import password_hasher
+
+    monkeypatch.setattr(password_hasher, "queue_depth", -password_hasher.pool_size)
+    response = await client.post("/api/auth", json={
+        "username": "newuser",
+        "password": "password123"
+    })
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+async def test_password_hasher_thread_pool():
+    from app.core.hashing import PasswordHasher
+
+    hasher = PasswordHasher(executor="thread", pool_size=1, queue_depth=0)
+    hashed = await hasher.hash("secret")
+
+    assert await hasher.verify("secret", hashed)
+    assert not await hasher.verify("wrong", hashed)
+    assert hasher.stats.completed == 3
+    assert hasher.pending == 0
+    hasher.shutdown()
+
+async def test_password_hasher_falls_back_when_pool_cannot_start(monkeypatch):
+    from app.core import hashing
+
+    def no_process_pool(*args, **kwargs):
+        raise OSError("no /dev/shm")
+
+    monkeypatch.setattr(hashing, "ProcessPoolExecutor", no_process_pool)
+    hasher = hashing.PasswordHasher(executor="process", pool_size=1, queue_depth=0)
+    for _ in range(3):
+        assert await hasher.verify("secret", await hasher.hash("secret"))
+
+    assert hasher.kind == "thread"
+    assert hasher.pending == 0
+    hasher.shutdown()
+
+async def test_token_carries_user_id(client: AsyncClient, db_session: AsyncSession):
+    from jose import jwt
+    from app.core.config import settings
+
+    response = await client.post("/api/auth", json={
+        "username": "newuser",
+        "password": "password123"
+    })
+    payload = jwt.decode(
+        response.json()["token"],
+        settings.SECRET_KEY.get_secret_value(),
+        algorithms=["HS256"]
+    )
+
+    result = await db_session.execute(text("SELECT id FROM users WHERE username = 'newuser'"))
+    assert payload["uid"] == result.scalar()
+    assert payload["sub"] == "newuser"
+
+async def test_identity_cache_eviction_and_ttl(monkeypatch):
+    from app.core import identity
+    from app.core.identity import IdentityCache
+
+    cache = IdentityCache(max_size=2, ttl=10)
+    cache.put(1, "a")
+    cache.put(2, "b")
+    cache.get(1)
+    cache.put(3, "c")
+
+    assert cache.get(2) is None
+    assert cache.get(1).username == "a"
+
+    now = identity.time.monotonic()
+    monkeypatch.setattr(identity.time, "monotonic", lambda: now + 11)
+    assert cache.get(1) is None
+    assert len(cache) == 1
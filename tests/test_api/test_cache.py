@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from app.db.cache import RedisCache
+from app.db.near_cache import NearCache
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_near_cache_evicts_by_count_and_size():
+    near = NearCache(max_entries=2, max_bytes=100, ttl=60)
+
+    near.put("user_info:1", "a", 10)
+    near.put("user_info:2", "b", 10)
+    assert near.get("user_info:1") == "a"
+    near.put("user_info:3", "c", 10)
+
+    assert near.get("user_info:2") is None
+    assert len(near) == 2
+
+    near.put("token:1", "d", 95)
+    assert len(near) == 1
+    assert near.size == 95
+    assert near.stats() == {"user_info": {"hits": 1, "misses": 1, "evictions": 3}}
+
+async def test_near_cache_expires_entries():
+    near = NearCache(max_entries=10, max_bytes=100, ttl=0)
+
+    near.put("user_info:1", "a", 10)
+
+    assert near.get("user_info:1") is None
+    assert near.size == 0
+
+async def test_near_cache_invalidated_across_workers():
+    first = RedisCache(NearCache(max_entries=10, max_bytes=1024, ttl=60))
+    second = RedisCache(NearCache(max_entries=10, max_bytes=1024, ttl=60))
+    await first.init()
+    await second.init()
+
+    async def subscribed(cache: RedisCache):
+        while cache.local_get("probe") is None:
+            cache.near.put("probe", 1, 1)
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(asyncio.gather(subscribed(first), subscribed(second)), 1)
+
+    try:
+        await first.set("shared", {"value": 1})
+        assert await second.get("shared") == {"value": 1}
+        assert second.near.stats()["shared"]["misses"] == 1
+
+        await first.set("shared", {"value": 2})
+        for _ in range(100):
+            if second.local_get("shared") is None:
+                break
+            await asyncio.sleep(0.01)
+
+        assert await second.get("shared") == {"value": 2}
+        assert await first.get("shared") == {"value": 2}
+        assert first.near.stats()["shared"] == {"hits": 1, "misses": 0, "evictions": 0}
+    finally:
+        await first.close()
+        await second.close()
+
+async def test_concurrent_commands_are_pipelined():
+    cache = RedisCache()
+    try:
+        await cache.set("warmup", 0)
+        pipelines = cache.pipelines
+
+        await asyncio.gather(*(cache.set(f"key:{n}", n) for n in range(200)))
+        assert await asyncio.gather(
+            *(cache.get(f"key:{n}") for n in range(200)), cache.get("missing")
+        ) == [*range(200), None]
+        assert cache.pipelines - pipelines == 2
+
+        deleted = await asyncio.gather(*(cache.delete(f"key:{n}") for n in range(100)))
+        assert deleted == [True] * 100
+        assert await asyncio.gather(cache.get("key:0"), cache.get("key:150")) == [None, 150]
+    finally:
+        await cache.close()
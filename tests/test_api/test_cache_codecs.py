@@ -0,0 +1,36 @@
+import json
+import pytest
+from app.db.cache import RedisCache
+from app.db.value_codecs import FLAG_ZLIB, MAGIC, ValueCodec, get_serializer
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_codec_header_and_compression():
+    codec = ValueCodec(get_serializer("msgpack"), compress_threshold=64)
+    small = {"coins": 10}
+    large = {"sent": [{"toUser": "user_1", "amount": 5}] * 50}
+
+    encoded = codec.encode(small)
+    assert encoded[:3] == bytes((MAGIC, get_serializer("msgpack").id, 0))
+    assert ValueCodec.decode(encoded) == small
+
+    encoded = codec.encode(large)
+    assert encoded[2] == FLAG_ZLIB
+    assert len(encoded) < len(json.dumps(large))
+    assert ValueCodec.decode(encoded) == large
+
+async def test_codec_reads_legacy_json_and_skips_unknown_formats():
+    assert ValueCodec.decode(json.dumps({"coins": 10}).encode()) == {"coins": 10}
+    assert ValueCodec.decode(bytes((MAGIC, 99, 0)) + b"data") is None
+    assert ValueCodec.decode(bytes((MAGIC, 1, 0x80)) + b"{}") is None
+
+async def test_cache_values_stored_with_codec():
+    cache = RedisCache(codec=ValueCodec(get_serializer("msgpack")))
+    try:
+        await cache.set("packed:1", {"coins": 2})
+
+        assert (await cache.command("GET", "packed:1", raw=True))[1] == get_serializer("msgpack").id
+        assert await cache.get("packed:1") == {"coins": 2}
+    finally:
+        await cache.close()
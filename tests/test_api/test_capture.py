@@ -0,0 +1,59 @@
+import json
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from app.middleware.capture import REDACTED, Anonymizer, CaptureLog, TrafficCapture
+from tests.load.replay import AccountMap
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_capture_records_shape_without_secrets(tmp_path, test_user, db_session):
+    from app.models.models import User
+    db_session.add(User(username="recipient", password_hash="x", coins=0))
+    await db_session.commit()
+
+    log = CaptureLog(str(tmp_path / "traffic-{pid}.jsonl"), 1024 * 1024, 1)
+    captured = TrafficCapture(app, log, key=b"capture-key")
+    async with AsyncClient(transport=ASGITransport(app=captured), base_url="http://test") as client:
+        await client.post("/api/auth", json={"username": "testuser", "password": "testpass"})
+        client.headers["Authorization"] = f"Bearer {test_user['token']}"
+        await client.get("/api/buy/cup")
+        await client.post("/api/sendCoin", json={"toUser": "recipient", "amount": 7})
+    log.close()
+
+    text = open(log.path, encoding="utf-8").read()
+    assert "testpass" not in text
+    assert "recipient" not in text
+    auth, buy, send = (json.loads(line) for line in text.splitlines())
+
+    anonymizer = Anonymizer(b"capture-key")
+    user = anonymizer.hash("testuser")
+    assert auth["route"] == "/api/auth"
+    assert auth["principal"] is None
+    assert auth["body"] == {"username": user, "password": REDACTED}
+
+    assert buy["route"] == "/api/buy/{item}"
+    assert buy["path"] == "/api/buy/cup"
+    assert buy["principal"] == user
+    assert buy["status"] == 200
+    assert buy["body"] is None
+    assert buy["ts"] <= send["ts"]
+
+    assert send["body"] == {"toUser": anonymizer.hash("recipient"), "amount": 7}
+    assert send["status"] == 200
+    assert send["ms"] > 0
+
+async def test_replay_maps_hashes_to_accounts():
+    accounts = AccountMap(
+        [{"username": "load_user_0", "token": "a"}, {"username": "load_user_1", "token": "b"}],
+        "loadtest"
+    )
+    assert accounts["#sender"]["token"] == "a"
+    assert accounts.body({"toUser": "#recipient", "amount": 7}) == {
+        "toUser": "load_user_1", "amount": 7
+    }
+    assert accounts.body({"username": "#sender", "password": REDACTED}) == {
+        "username": "load_user_0", "password": "loadtest"
+    }
+    assert accounts["#third"]["username"] == "load_user_0"
@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.core.config import settings
+from app.core.metrics import Histogram
+from app.db.pool import InstrumentedPool
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_pool_metrics_count_checkouts_and_timeouts():
+    engine = create_async_engine(
+        settings.POSTGRES_URL,
+        poolclass=InstrumentedPool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05
+    )
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            assert engine.pool.snapshot()["checked_out"] == 1
+
+            with pytest.raises(exc.TimeoutError):
+                async with engine.connect():
+                    pass
+
+        snapshot = engine.pool.snapshot()
+        assert snapshot["checked_out"] == 0
+        assert snapshot["checkouts"] == 1
+        assert snapshot["timeouts"] == 1
+        assert snapshot["wait_seconds"]["count"] == 2
+        assert snapshot["wait_seconds"]["p99"] >= 0.05
+    finally:
+        await engine.dispose()
+
+async def test_histogram_buckets():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float("inf"), 4)]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.count == 4
@@ -0,0 +1,118 @@
+from datetime import datetime, timezone
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import Transaction, User
+
+pytestmark = pytest.mark.asyncio
+
+
+async def seed_received(db_session: AsyncSession, count: int) -> User:
+    sender = User(username="sender", password_hash="x", coins=1000)
+    db_session.add(sender)
+    await db_session.flush()
+    # Pairs of rows share a timestamp so the id tie-breaker is exercised.
+    db_session.add_all([
+        Transaction(
+            from_user_id=sender.id,
+            to_user_id=1,
+            amount=n,
+            created_at=datetime(2025, 1, 1, 0, 0, n // 2, tzinfo=timezone.utc)
+        )
+        for n in range(1, count + 1)
+    ])
+    await db_session.commit()
+    return sender
+
+async def test_history_pages_with_cursor(
+    authorized_client: AsyncClient,
+    db_session: AsyncSession
+):
+    await seed_received(db_session, 7)
+
+    amounts = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = await authorized_client.get("/api/history/received", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["items"]) <= 3
+        assert all(item["fromUser"] == "sender" for item in page["items"])
+        amounts += [item["amount"] for item in page["items"]]
+        pages += 1
+        cursor = page["nextCursor"]
+        if cursor is None:
+            break
+
+    assert amounts == [7, 6, 5, 4, 3, 2, 1]
+    assert pages == 3
+
+    sent = await authorized_client.get("/api/history/sent")
+    assert sent.json() == {"items": [], "nextCursor": None}
+
+async def test_history_rejects_bad_cursor(authorized_client: AsyncClient):
+    response = await authorized_client.get("/api/history/sent", params={"cursor": "garbage"})
+    assert response.status_code == 400
+
+    response = await authorized_client.get("/api/history/sent", params={"limit": 0})
+    assert response.status_code == 422
+
+async def test_info_inlines_capped_history(
+    authorized_client: AsyncClient,
+    db_session: AsyncSession
+):
+    from app.api.info import info_statement
+    from app.db.info_cache import InfoCache, InfoSnapshot
+
+    await seed_received(db_session, 5)
+
+    row = (await db_session.execute(info_statement(1, history_limit=2))).one()
+    assert row.received == ['{"fromUser":"sender","amount":4}', '{"fromUser":"sender","amount":5}']
+
+    cache = InfoCache(history_limit=2)
+    generation = (await cache.read(1)).generation
+    assert await cache.fill(1, generation, InfoSnapshot(row.coins, 0, [], row.received, []))
+    await cache.record_transfer(2, "sender", 1, 1, "testuser", 1, 6)
+
+    cached = await cache.get(1)
+    assert [entry["amount"] for entry in cached["coinHistory"]["received"]] == [5, 6]
+
+async def test_history_export_ndjson_and_csv(
+    authorized_client: AsyncClient,
+    db_session: AsyncSession
+):
+    import json
+
+    await seed_received(db_session, 3)
+    await authorized_client.post("/api/sendCoin", json={"toUser": "sender", "amount": 10})
+
+    response = await authorized_client.get("/api/history/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [(row["direction"], row["user"], row["amount"]) for row in rows] == [
+        ("received", "sender", 1), ("received", "sender", 2), ("received", "sender", 3),
+        ("sent", "sender", 10)
+    ]
+
+    response = await authorized_client.get("/api/history/export", params={"format": "csv"})
+    lines = response.text.splitlines()
+    assert lines[0] == "id,createdAt,direction,user,amount"
+    assert len(lines) == 5
+    assert lines[-1].endswith(",sent,sender,10")
+
+async def test_history_export_streams_in_batches(test_user, db_session: AsyncSession):
+    from app.api.history import export_ledger
+    from app.db.replicas import replica_router
+
+    await seed_received(db_session, 5)
+
+    chunks = export_ledger(replica_router.session, 1, "ndjson", batch_size=2)
+    assert (await anext(chunks)).count("\n") == 2
+    # Closing early (as on a client disconnect) releases the cursor and session.
+    await chunks.aclose()
+
+    chunks = [chunk async for chunk in export_ledger(replica_router.session, 1, "ndjson", batch_size=2)]
+    assert [chunk.count("\n") for chunk in chunks] == [2, 2, 1]
@@ -1,3 +1,4 @@
+import json
 import pytest
 from httpx import AsyncClient
 from sqlalchemy import text
@@ -35,4 +36,149 @@ async def test_get_info(authorized_client: AsyncClient, db_session: AsyncSession
     assert "coinHistory" in data
 
     await db_session.commit()
-    
\ No newline at end of file
+    
+async def test_get_info_aggregates_in_one_query(authorized_client: AsyncClient, max_queries):
+    from app.db.info_cache import info_cache
+
+    await authorized_client.get("/api/buy/cup")
+    await authorized_client.get("/api/buy/cup")
+    await authorized_client.get("/api/buy/pen")
+    await info_cache.invalidate(1)
+
+    response = await authorized_client.get("/api/info")
+    assert response.status_code == 200
+    # One for the identity of this uid-less token, one for the whole document.
+    max_queries(response, statements=2)
+    assert response.json() == {
+        "coins": 1000 - 2 * 20 - 10,
+        "inventory": [
+            {"type": "cup", "quantity": 2},
+            {"type": "pen", "quantity": 1}
+        ],
+        "coinHistory": {"received": [], "sent": []}
+    }
+
+async def test_writes_patch_cached_info(
+    authorized_client: AsyncClient,
+    db_session: AsyncSession
+):
+    from app.db.info_cache import info_cache
+    from app.models.models import User
+
+    recipient = User(username="recipient", password_hash="x", coins=1000)
+    db_session.add(recipient)
+    await db_session.commit()
+
+    await authorized_client.get("/api/info")
+    await authorized_client.get("/api/buy/cup")
+    await authorized_client.post("/api/sendCoin", json={"toUser": "recipient", "amount": 30})
+
+    cached = await info_cache.get(1)
+    assert cached == {
+        "coins": 1000 - 20 - 30,
+        "inventory": [{"type": "cup", "quantity": 1}],
+        "coinHistory": {"received": [], "sent": [{"toUser": "recipient", "amount": 30}]}
+    }
+    assert await info_cache.get(recipient.id) is None
+    assert (await authorized_client.get("/api/info")).json() == cached
+
+async def test_info_cache_single_flight():
+    import asyncio
+    from app.db.replicas import replica_router
+    from app.db.info_cache import InfoCache, InfoSnapshot
+
+    cache = InfoCache()
+    calls = []
+    document = {"coins": 5, "inventory": [], "coinHistory": {"received": [], "sent": []}}
+
+    async def load(session):
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return InfoSnapshot(5, 0, [], [], [])
+
+    results = await asyncio.gather(*[
+        cache.get_or_load(7, load, replica_router.session) for _ in range(10)
+    ])
+
+    assert [(json.loads(body), version) for body, version in results] == [(document, 0)] * 10
+    assert len(calls) == 1
+    assert await cache.get(7) == document
+
+async def test_info_cache_rebuild_outlives_cancelled_caller():
+    import asyncio
+    from app.db.replicas import replica_router
+    from app.db.info_cache import InfoCache, InfoSnapshot
+
+    cache = InfoCache()
+    sessions = []
+
+    async def load(session):
+        sessions.append(session)
+        await asyncio.sleep(0.05)
+        assert session.session.is_active
+        return InfoSnapshot(5, 0, [], [], [])
+
+    first = asyncio.ensure_future(cache.get_or_load(9, load, replica_router.session))
+    second = asyncio.ensure_future(cache.get_or_load(9, load, replica_router.session))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    body, version = await second
+    assert json.loads(body)["coins"] == 5
+    assert len(sessions) == 1
+    assert (await cache.get(9))["coins"] == 5
+
+async def test_info_cache_rejects_stale_fill():
+    from app.db.info_cache import InfoCache, InfoSnapshot
+
+    cache = InfoCache()
+
+    generation = (await cache.read(8)).generation
+    await cache.record_purchase(8, 1, "pen", 10)
+
+    assert not await cache.fill(8, generation, InfoSnapshot(5, 0, [], [], []))
+    assert await cache.get(8) is None
+
+    generation = (await cache.read(8)).generation
+    assert await cache.fill(8, generation, InfoSnapshot(5, 1, [], [], []))
+    assert not await cache.fill(8, generation, InfoSnapshot(15, 0, [], [], []))
+    assert (await cache.get(8))["coins"] == 5
+
+    await cache.record_purchase(8, 3, "pen", 10)
+    assert await cache.get(8) is None
+
+async def test_info_served_from_rendered_body(
+    authorized_client: AsyncClient,
+    db_session: AsyncSession
+):
+    from app.db.info_cache import info_cache
+    from app.models.models import User
+
+    recipient = User(username='получатель "q"', password_hash="x", coins=1000)
+    db_session.add(recipient)
+    await db_session.commit()
+
+    await authorized_client.post("/api/sendCoin", json={"toUser": recipient.username, "amount": 30})
+    miss = await authorized_client.get("/api/info")
+    hit = await authorized_client.get("/api/info")
+
+    assert miss.headers["content-type"] == "application/json"
+    assert hit.content == miss.content
+    assert hit.json()["coinHistory"]["sent"] == [{"toUser": 'получатель "q"', "amount": 30}]
+    assert (await info_cache.read(1)).body == hit.content
+
+async def test_info_conditional_get(authorized_client: AsyncClient):
+    first = await authorized_client.get("/api/info")
+    etag = first.headers["etag"]
+
+    cached = await authorized_client.get("/api/info", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    await authorized_client.get("/api/buy/pen")
+
+    changed = await authorized_client.get("/api/info", headers={"If-None-Match": f'W/{etag}'})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["coins"] == 990
@@ -0,0 +1,70 @@
+import pytest
+from httpx import AsyncClient
+from app.core.metrics import Registry
+
+pytestmark = pytest.mark.asyncio
+
+
+def sample(text: str, name: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{name} not exported")
+
+async def test_metrics_endpoint(authorized_client: AsyncClient):
+    await authorized_client.get("/api/info")
+    await authorized_client.get("/api/info")
+
+    response = await authorized_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+
+    assert sample(
+        text, 'http_request_duration_seconds_count{method="GET",route="/api/info",status="200"}'
+    ) >= 2
+    assert sample(text, "http_requests_in_flight") >= 1
+    assert sample(text, 'info_cache_requests_total{result="hit"}') >= 1
+    assert sample(text, 'info_cache_requests_total{result="miss"}') >= 1
+    assert sample(text, "db_queries_total") >= 1
+    assert sample(text, 'db_queries_per_request_bucket{le="+Inf"}') >= 2
+    assert sample(text, 'redis_command_duration_seconds_count{command="EVALSHA"}') >= 1
+    assert "# TYPE db_pool_wait_seconds histogram" in text
+
+async def test_registry_text_format():
+    registry = Registry()
+    rejections = registry.counter("rejections_total", "Rejected requests", ("route", "reason"))
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    registry.gauge("queue_depth", "Queued jobs", collect=lambda: {(): 3})
+
+    rejections.inc("/api/buy/{item}", "limited")
+    rejections.inc("/api/buy/{item}", "limited")
+    latency.observe(0.5)
+
+    assert registry.render().splitlines() == [
+        "# HELP rejections_total Rejected requests",
+        "# TYPE rejections_total counter",
+        'rejections_total{route="/api/buy/{item}",reason="limited"} 2',
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 0',
+        'latency_seconds_bucket{le="1.0"} 1',
+        'latency_seconds_bucket{le="+Inf"} 1',
+        "latency_seconds_sum 0.5",
+        "latency_seconds_count 1",
+        "# HELP queue_depth Queued jobs",
+        "# TYPE queue_depth gauge",
+        "queue_depth 3",
+    ]
+
+async def test_failed_statement_leaves_no_timing_state():
+    from sqlalchemy import text
+    from sqlalchemy.exc import DBAPIError
+    from tests.conftest import engine
+
+    async with engine.connect() as conn:
+        with pytest.raises(DBAPIError):
+            await conn.execute(text("SELECT missing_column FROM users"))
+        await conn.rollback()
+        assert await conn.scalar(text("SELECT 1")) == 1
+        assert "query_started" not in conn.info
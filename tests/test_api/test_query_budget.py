@@ -0,0 +1,121 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.base import make_engine
+from app.db.instrumentation import QueryStats, request_queries
+from app.models.models import User
+from tests.conftest import TEST_DATABASE_URL
+
+pytestmark = pytest.mark.asyncio
+
+# Statement and round trip budgets of the hot endpoints. A round trip is a
+# statement, the BEGIN / COMMIT / ROLLBACK around it or a pool pre-ping.
+# Raising a budget should be a deliberate choice made in review, not a side
+# effect.
+
+
+async def login(client: AsyncClient, username: str = "budget") -> AsyncClient:
+    # Tokens from /api/auth carry the user id, so the identity cache answers
+    # get_current_identity without a query, as it does in production.
+    response = await client.post("/api/auth", json={"username": username, "password": "secret"})
+    client.headers["Authorization"] = f"Bearer {response.json()['token']}"
+    return client
+
+async def test_info_query_budget(client: AsyncClient, max_queries):
+    await login(client)
+
+    response = await client.get("/api/info")
+    assert response.status_code == 200
+    max_queries(response, statements=1, round_trips=3)
+
+    response = await client.get("/api/info")
+    max_queries(response, statements=0, round_trips=0)
+
+    etag = response.headers["ETag"]
+    response = await client.get("/api/info", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    max_queries(response, statements=0, round_trips=0)
+
+async def test_buy_query_budget(client: AsyncClient, max_queries):
+    await login(client)
+    await client.get("/api/info")
+
+    response = await client.get("/api/buy/cup")
+    assert response.status_code == 200
+    max_queries(response, statements=1, round_trips=3)
+
+    response = await client.get("/api/buy/unknown")
+    assert response.status_code == 404
+    max_queries(response, statements=0, round_trips=0)
+
+    # The purchase patches the cached /api/info instead of invalidating it.
+    response = await client.get("/api/info")
+    assert response.json()["inventory"] == [{"type": "cup", "quantity": 1}]
+    max_queries(response, statements=0, round_trips=0)
+
+async def test_checkout_query_budget(client: AsyncClient, max_queries):
+    await login(client)
+
+    response = await client.post("/api/buy", json={"items": {"cup": 2, "pen": 1, "book": 1}})
+    assert response.status_code == 200
+    max_queries(response, statements=1, round_trips=3)
+
+async def test_send_coin_query_budget(
+    client: AsyncClient,
+    db_session: AsyncSession,
+    max_queries
+):
+    db_session.add(User(username="recipient", password_hash="x", coins=0))
+    await db_session.commit()
+    await login(client)
+
+    response = await client.post("/api/sendCoin", json={"toUser": "recipient", "amount": 10})
+    assert response.status_code == 200
+    max_queries(response, statements=2, round_trips=4)
+
+    response = await client.post("/api/sendCoin", json={"toUser": "nobody", "amount": 10})
+    assert response.status_code == 404
+    max_queries(response, statements=1, round_trips=3)
+
+async def test_legacy_token_costs_one_lookup(authorized_client: AsyncClient, max_queries):
+    # The test_user token has no user id, so every request resolves it by name.
+    response = await authorized_client.get("/api/buy/cup")
+    assert response.status_code == 200
+    max_queries(response, statements=2, round_trips=4)
+
+async def test_round_trips_in_metrics(client: AsyncClient):
+    await login(client)
+    await client.get("/api/buy/cup")
+
+    response = await client.get("/metrics")
+    assert "# TYPE db_round_trips_total counter" in response.text
+    assert 'db_round_trips_per_request_bucket{le="+Inf"}' in response.text
+
+async def round_trips(engine, checkouts: int) -> int:
+    stats = QueryStats()
+    token = request_queries.set(stats)
+    try:
+        for _ in range(checkouts):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                await conn.rollback()
+    finally:
+        request_queries.reset(token)
+    return stats.round_trips
+
+async def test_pool_defaults_add_no_round_trips():
+    engine = make_engine(TEST_DATABASE_URL)
+    try:
+        assert await round_trips(engine, 3) == 9
+    finally:
+        await engine.dispose()
+
+async def test_pre_ping_round_trips_are_counted():
+    # The first checkout opens the connection and is not pinged; each reuse
+    # costs BEGIN, the ping and ROLLBACK on top of the three of the query.
+    engine = make_engine(TEST_DATABASE_URL, pool_pre_ping=True)
+    try:
+        assert await round_trips(engine, 3) == 3 + 6 + 6
+    finally:
+        await engine.dispose()
@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+from app.db.cache import redis_cache
+from app.middleware.rate_limiter import RateLimiter
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_rate_limit_exhausts_budget():
+    limiter = RateLimiter(max_requests={"/api/info": 3}, window_seconds=60)
+    await redis_cache.delete("ratelimit:/api/info:10.0.0.1")
+
+    decisions = [await limiter.check_rate_limit("/api/info", "10.0.0.1") for _ in range(4)]
+
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert [d.remaining for d in decisions[:3]] == [2, 1, 0]
+    assert decisions[3].retry_after > 0
+
+async def test_hybrid_limiter_leases_budget_in_chunks():
+    limiter = RateLimiter(max_requests={"/api/info": 100}, window_seconds=60)
+    await redis_cache.delete("ratelimit:/api/info:10.0.0.3")
+
+    decisions = [await limiter.check_rate_limit("/api/info", "10.0.0.3") for _ in range(150)]
+
+    assert sum(d.allowed for d in decisions) == 100
+    assert limiter.redis_decisions <= 20
+    assert limiter.local_decisions >= 130
+    assert decisions[-1].retry_after > 0
+
+async def test_banned_client_is_rejected():
+    limiter = RateLimiter(max_errors=2, ban_duration_seconds=5)
+    await redis_cache.delete("errors:10.0.0.2")
+
+    assert not await limiter.record_error("10.0.0.2")
+    assert await limiter.record_error("10.0.0.2")
+
+    decision = await limiter.check_rate_limit("/api/info", "10.0.0.2")
+    assert decision.banned
+    assert not decision.allowed
+    await redis_cache.delete("ban:10.0.0.2")
+
+async def test_own_ban_revokes_leased_tokens():
+    limiter = RateLimiter(
+        max_requests={"/api/info": 100}, max_errors=1, ban_duration_seconds=5
+    )
+    await asyncio.gather(
+        redis_cache.delete("errors:10.0.0.4"),
+        redis_cache.delete("ratelimit:/api/info:10.0.0.4")
+    )
+
+    assert (await limiter.check_rate_limit("/api/info", "10.0.0.4")).allowed
+    assert await limiter.record_error("10.0.0.4")
+
+    redis_decisions = limiter.redis_decisions
+    decision = await limiter.check_rate_limit("/api/info", "10.0.0.4")
+    assert decision.banned
+    assert decision.retry_after > 4
+    assert limiter.redis_decisions == redis_decisions
+    await redis_cache.delete("ban:10.0.0.4")
+
+async def test_rate_limit_keyed_by_route_template(authorized_client: AsyncClient):
+    from starlette.requests import Request
+    from app.main import app
+
+    limiter = RateLimiter()
+    request = Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/buy/pen",
+        "headers": [],
+        "query_string": b"",
+        "app": app,
+    })
+    assert limiter.route_template(request) == "/api/buy/{item}"
+
+    response = await authorized_client.get("/api/buy/pen")
+    assert response.status_code == 200
+    assert response.headers["X-RateLimit-Limit"] == "100"
@@ -0,0 +1,188 @@
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+from app.core.metrics import db_read_sessions, db_replica_fallbacks
+from app.core.security import create_access_token
+from app.db.cache import redis_cache
+from app.db.info_cache import info_cache
+from app.db.replicas import Replica, ReplicaRouter, replica_router
+from app.models.models import User
+from tests.conftest import TEST_DATABASE_URL, engine
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    # The test database stands in for a replica: it is not in recovery, so
+    # the lag check reports 0.
+    replica = Replica(create_async_engine(TEST_DATABASE_URL, poolclass=NullPool))
+    monkeypatch.setattr(replica_router, "replicas", [replica])
+    return replica
+
+@pytest_asyncio.fixture
+async def hung_url():
+    # Accepts connections and never answers, like a replica behind a network
+    # partition: without a timeout a connect to it waits forever.
+    writers = []
+
+    async def accept(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writers.append(writer)
+
+    server = await asyncio.start_server(accept, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    yield make_url(TEST_DATABASE_URL).set(host="127.0.0.1", port=port)
+    server.close()
+    for writer in writers:
+        writer.close()
+    await server.wait_closed()
+
+def count(metric, *labels) -> float:
+    return metric.values.get(labels, 0)
+
+async def test_reads_go_to_a_replica_in_sync(authorized_client: AsyncClient, replica: Replica):
+    await replica_router.check()
+    assert replica.healthy and replica.lag == 0
+
+    before = count(db_read_sessions, "replica")
+    response = await authorized_client.get("/api/info")
+    assert response.status_code == 200
+    assert response.json()["coins"] == 1000
+    response = await authorized_client.get("/api/history/sent")
+    assert response.status_code == 200
+    assert count(db_read_sessions, "replica") == before + 2
+
+async def test_lagging_replica_is_skipped(authorized_client: AsyncClient, replica: Replica):
+    await replica_router.check()
+    replica.lag = replica_router.max_lag + 1
+
+    before = count(db_read_sessions, "primary")
+    response = await authorized_client.get("/api/info")
+    assert response.status_code == 200
+    assert count(db_read_sessions, "primary") == before + 1
+
+async def test_failed_replica_falls_back_to_primary(
+    authorized_client: AsyncClient,
+    replica: Replica
+):
+    missing = make_url(TEST_DATABASE_URL).set(database="missing_replica")
+    replica.engine = create_async_engine(missing, poolclass=NullPool)
+    replica.healthy, replica.lag = True, 0.0
+
+    before = count(db_replica_fallbacks, "error")
+    response = await authorized_client.get("/api/info")
+    assert response.status_code == 200
+    assert response.json()["coins"] == 1000
+    assert count(db_replica_fallbacks, "error") == before + 1
+    assert not replica.healthy
+    assert replica_router.pick() is None
+
+async def test_hung_replicas_fail_the_lag_check_concurrently(hung_url):
+    url = hung_url.render_as_string(hide_password=False)
+    router = ReplicaRouter([url] * 3, 1.0, 1.0, 30, 0.5, primary=engine)
+    for replica in router.replicas:
+        replica.healthy, replica.lag = True, 0.0
+    try:
+        started = time.perf_counter()
+        await router.check()
+        assert time.perf_counter() - started < 1.0
+        assert not any(replica.healthy for replica in router.replicas)
+    finally:
+        await router.close()
+
+async def test_hung_replica_read_falls_back_to_primary(
+    authorized_client: AsyncClient,
+    replica: Replica,
+    hung_url,
+    monkeypatch
+):
+    replica.engine = create_async_engine(hung_url, poolclass=NullPool)
+    replica.healthy, replica.lag = True, 0.0
+    monkeypatch.setattr(replica_router, "timeout", 0.2)
+
+    before = count(db_replica_fallbacks, "error")
+    response = await authorized_client.get("/api/info")
+    assert response.status_code == 200
+    assert response.json()["coins"] == 1000
+    assert count(db_replica_fallbacks, "error") == before + 1
+    assert not replica.healthy
+
+async def test_read_your_writes(authorized_client: AsyncClient, replica: Replica):
+    await replica_router.check()
+    response = await authorized_client.get("/api/buy/cup")
+    assert response.status_code == 200
+    assert await redis_cache.command("GET", "written_version:1") == "1"
+
+    # Pretend the replica has not replayed the user's last write yet, and
+    # drop the cached /api/info so it is loaded again.
+    await redis_cache.command("FLUSHDB")
+    await redis_cache.command("SET", "written_version:1", 2)
+    if redis_cache.near is not None:
+        redis_cache.near.clear()
+
+    before = count(db_replica_fallbacks, "stale")
+    response = await authorized_client.get("/api/history/sent")
+    assert response.status_code == 200
+    assert count(db_replica_fallbacks, "stale") == before + 1
+    # /api/info compares with the primary, which this replica does match.
+    response = await authorized_client.get("/api/info")
+    assert response.status_code == 200
+    assert response.json()["inventory"] == [{"type": "cup", "quantity": 1}]
+    assert count(db_replica_fallbacks, "stale") == before + 1
+
+async def test_recipient_info_not_cached_from_lagging_replica(
+    authorized_client: AsyncClient,
+    db_session: AsyncSession,
+    replica: Replica
+):
+    recipient = User(username="recipient", password_hash="x", coins=0)
+    db_session.add(recipient)
+    await db_session.commit()
+
+    # A replica that reports no lag but has not replayed the transfer yet:
+    # a copy of the tables taken before it.
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP SCHEMA IF EXISTS lagging CASCADE"))
+        await conn.execute(text("CREATE SCHEMA lagging"))
+        for table in ("users", "inventory", "transactions"):
+            await conn.execute(text(f"CREATE TABLE lagging.{table} AS TABLE public.{table}"))
+    replica.engine = create_async_engine(
+        TEST_DATABASE_URL,
+        poolclass=NullPool,
+        execution_options={"schema_translate_map": {None: "lagging"}}
+    )
+    await replica_router.check()
+
+    try:
+        response = await authorized_client.post(
+            "/api/sendCoin", json={"toUser": "recipient", "amount": 100}
+        )
+        assert response.status_code == 200
+        assert await redis_cache.command("GET", f"written_version:{recipient.id}") == "1"
+
+        headers = {
+            "Authorization": "Bearer " + create_access_token(
+                {"sub": "recipient", "uid": recipient.id}
+            )
+        }
+        before = count(db_replica_fallbacks, "stale")
+        assert (await authorized_client.get("/api/info", headers=headers)).json()["coins"] == 100
+
+        # Without the recorded write the primary still catches the stale read.
+        await redis_cache.command("DEL", f"written_version:{recipient.id}")
+        await info_cache.invalidate(recipient.id)
+        assert (await authorized_client.get("/api/info", headers=headers)).json()["coins"] == 100
+        assert count(db_replica_fallbacks, "stale") == before + 2
+
+        response = await authorized_client.get("/api/info", headers=headers)
+        assert response.json()["coins"] == 100
+        assert response.headers["ETag"] == f'"{recipient.id}.1"'
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP SCHEMA lagging CASCADE"))
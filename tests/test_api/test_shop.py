@@ -63,4 +63,80 @@ async def test_buy_multiple_same_items(
     )
     quantity = result.scalar()
     assert quantity == 2
-    
\ No newline at end of file
+    
+async def test_concurrent_purchases_never_overdraw(
+    authorized_client: AsyncClient,
+    db_session: AsyncSession
+):
+    import asyncio
+
+    responses = await asyncio.gather(*[
+        authorized_client.get("/api/buy/pink-hoody") for _ in range(6)
+    ])
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 200, 400, 400, 400, 400]
+
+    result = await db_session.execute(
+        text("SELECT count(*), sum(quantity) FROM inventory WHERE item_name = 'pink-hoody'")
+    )
+    assert tuple(result.one()) == (1, 2)
+
+    result = await db_session.execute(
+        text("SELECT coins FROM users WHERE username = 'testuser'")
+    )
+    assert result.scalar() == 0
+
+async def test_checkout_buys_whole_cart(
+    authorized_client: AsyncClient,
+    db_session: AsyncSession
+):
+    await authorized_client.get("/api/buy/pen")
+
+    response = await authorized_client.post(
+        "/api/buy", json={"items": {"pen": 2, "cup": 1, "socks": 3}}
+    )
+    assert response.status_code == 200
+
+    result = await db_session.execute(
+        text("SELECT item_name, quantity FROM inventory ORDER BY item_name")
+    )
+    assert result.all() == [("cup", 1), ("pen", 3), ("socks", 3)]
+
+    total = MERCH_PRICES["pen"] * 3 + MERCH_PRICES["cup"] + MERCH_PRICES["socks"] * 3
+    response = await authorized_client.get("/api/info")
+    assert response.json()["coins"] == 1000 - total
+    assert sorted(
+        (entry["type"], entry["quantity"]) for entry in response.json()["inventory"]
+    ) == [("cup", 1), ("pen", 3), ("socks", 3)]
+
+async def test_checkout_is_all_or_nothing(
+    authorized_client: AsyncClient,
+    db_session: AsyncSession
+):
+    response = await authorized_client.post(
+        "/api/buy", json={"items": {"pen": 1, "pink-hoody": 2}}
+    )
+    assert response.status_code == 400
+    assert "Insufficient coins" in response.json()["detail"]
+
+    response = await authorized_client.post(
+        "/api/buy", json={"items": {"pen": 2**31 - 1, "pink-hoody": 2**31 - 1}}
+    )
+    assert response.status_code == 400
+
+    response = await authorized_client.post(
+        "/api/buy", json={"items": {"pen": 1, "invalid-item": 1}}
+    )
+    assert response.status_code == 404
+
+    result = await db_session.execute(text("SELECT count(*) FROM inventory"))
+    assert result.scalar() == 0
+    result = await db_session.execute(
+        text("SELECT coins FROM users WHERE username = 'testuser'")
+    )
+    assert result.scalar() == 1000
+
+@pytest.mark.parametrize("items", [{}, {"pen": 0}, {"pen": -1}, {"pen": 2**31}])
+async def test_checkout_rejects_empty_lines(authorized_client: AsyncClient, items):
+    response = await authorized_client.post("/api/buy", json={"items": items})
+    assert response.status_code == 422
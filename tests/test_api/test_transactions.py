@@ -75,6 +75,17 @@ async def test_send_coins_yourself(authorized_client: AsyncClient):
     assert response.status_code == 400
     assert "Cannot send coins to yourself" in response.json()["detail"]
 
+async def test_transfer_from_missing_user(db_session: AsyncSession):
+    from fastapi import HTTPException
+    from app.services import transfers
+
+    await test_create_recipient(db_session)
+    with pytest.raises(HTTPException) as error:
+        await transfers.transfer_coins(db_session, 999999, "newuser", 10)
+
+    assert error.value.status_code == 401
+    assert error.value.detail == "User not found"
+
 async def test_send_coins_negative_amount(authorized_client: AsyncClient):
     response = await authorized_client.post("/api/sendCoin", json={
         "toUser": "newuser",
@@ -82,4 +93,29 @@ async def test_send_coins_negative_amount(authorized_client: AsyncClient):
     })
     
     assert response.status_code == 422
-    
\ No newline at end of file
+    
+async def test_transfer_retries_serialization_failure(
+    db_session: AsyncSession,
+    monkeypatch
+):
+    from sqlalchemy.exc import DBAPIError
+    from app.services import transfers
+
+    class SerializationFailure(Exception):
+        sqlstate = "40001"
+
+    calls = []
+
+    async def flaky_transfer(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise DBAPIError("UPDATE users", {}, SerializationFailure())
+        return 42
+
+    monkeypatch.setattr(transfers, "_transfer_once", flaky_transfer)
+    recipient_id = await transfers.transfer_coins(
+        db_session, 1, "newuser", 10, base_delay=0
+    )
+
+    assert recipient_id == 42
+    assert len(calls) == 2
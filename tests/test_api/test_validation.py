@@ -42,4 +42,10 @@ async def test_validation_coin_amount(authorized_client: AsyncClient):
         "amount": 10.5
     })
     assert response.status_code == 422
-    
\ No newline at end of file
+    
+async def test_token_user_id_mismatch(client: AsyncClient, test_user: dict):
+    token = create_access_token(data={"sub": "someone_else", "uid": 1})
+
+    client.headers["Authorization"] = f"Bearer {token}"
+    response = await client.get("/api/info")
+    assert response.status_code == 401
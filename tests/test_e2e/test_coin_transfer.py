@@ -162,4 +162,40 @@ async def test_multiple_transfers(
     assert user1_info["coins"] == 500
     assert user2_info["coins"] == 1100
     assert user3_info["coins"] == 1400
-    
\ No newline at end of file
+    
+@pytest.mark.asyncio
+async def test_concurrent_opposite_transfers(
+    client: AsyncClient,
+    db_session: AsyncSession,
+    test_user: dict
+):
+    import asyncio
+    from sqlalchemy import text
+
+    other = await create_test_user(db_session, "other_user")
+
+    async def send(token: str, recipient: str):
+        return await client.post(
+            "/api/sendCoin",
+            headers={"Authorization": f"Bearer {token}"},
+            json={"toUser": recipient, "amount": 300}
+        )
+
+    requests = []
+    for _ in range(4):
+        requests.append(send(test_user["token"], "other_user"))
+        requests.append(send(other["token"], test_user["username"]))
+    responses = await asyncio.gather(*requests)
+
+    assert all(response.status_code in (200, 400) for response in responses)
+    succeeded = sum(response.status_code == 200 for response in responses)
+
+    result = await db_session.execute(
+        text("SELECT min(coins), sum(coins) FROM users")
+    )
+    min_coins, total_coins = result.one()
+    assert min_coins >= 0
+    assert total_coins == 2000
+
+    result = await db_session.execute(text("SELECT count(*) FROM transactions"))
+    assert result.scalar() == succeeded